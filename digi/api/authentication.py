@@ -0,0 +1,92 @@
+import copy
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import LocalTTLCache
+
+user_cache = LocalTTLCache(
+    size=getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 30),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps recently authenticated users in a short-TTL
+    in-process cache keyed by user id, so a request with a valid access token
+    normally costs no database query.
+
+    Entries are dropped when the user is saved or deleted in this process (see
+    ``api.signals``); other processes pick changes up within AUTH_USER_CACHE_TTL.
+    """
+
+    def get_user(self, validated_token):
+        # Claims may carry the id as a string; key the cache on str(id)
+        user_id = str(validated_token.get(api_settings.USER_ID_CLAIM))
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        elif api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation depends on the password hash; keep the stock check
+            user = super().get_user(validated_token)
+        # Each request gets its own copy so views can modify request.user freely
+        return copy.copy(user)
+
+
+class ClaimsUser(TokenUser):
+    """
+    User built from access token claims alone (see ``api.tokens.USER_CLAIMS``).
+    Claims are as fresh as the token, so they can lag the members row by up
+    to the access token lifetime. Code that needs the real row uses
+    ``request.user.instance``, which loads it on first access.
+    """
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+    @cached_property
+    def instance(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+
+class ClaimsJWTAuthentication(CachedJWTAuthentication):
+    """
+    For read-only requests (GET, HEAD, OPTIONS) ``request.user`` is a
+    ``ClaimsUser`` and no user lookup happens at all. Other methods get the
+    full members row as with ``CachedJWTAuthentication``. Meant for catalog
+    and review views, which never need the row to answer a read.
+    """
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_claims_user(validated_token), validated_token
+
+    def get_claims_user(self, validated_token):
+        if 'is_active' not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+            # Issued before claims were added to tokens
+            return self.get_user(validated_token)
+        if not validated_token['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return ClaimsUser(validated_token)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import quote_etag
+
+
+class LocalTTLCache:
+    """
+    Thread-safe in-process LRU whose entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TieredCache:
+    """
+    Versioned read-through cache with an in-process LRU in front of the shared
+    cache (Redis in production).
+
+    Every key lives under the namespace's current version, so invalidating the
+    whole namespace is a single ``incr`` on the version key; stale entries are
+    simply never read again and expire on their own. The local tier only keeps
+    entries for ``local_ttl`` seconds, which bounds how long another worker can
+    keep serving a namespace after it was invalidated.
+    """
+
+    def __init__(self, namespace, timeout=None, local_size=None, local_ttl=None):
+        self.namespace = namespace
+        self.timeout = timeout if timeout is not None else getattr(settings, 'TIERED_CACHE_TIMEOUT', 3600)
+        self.local_size = local_size if local_size is not None else getattr(settings, 'TIERED_CACHE_LOCAL_SIZE', 128)
+        self.local_ttl = local_ttl if local_ttl is not None else getattr(settings, 'TIERED_CACHE_LOCAL_TTL', 5)
+        self._local = LocalTTLCache(self.local_size, self.local_ttl)
+
+    @property
+    def version_key(self):
+        return f'{self.namespace}:version'
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Seed from the clock so an evicted version key never brings back
+            # entries written under an older version.
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get_or_set(self, name, loader):
+        """
+        Return the cached value for ``name``, calling ``loader()`` to build it
+        on a miss in both tiers.
+        """
+        value = self._local.get(name)
+        if value is not None:
+            return value
+
+        key = f'{self.namespace}:{self.version()}:{name}'
+        value = cache.get(key)
+        if value is None:
+            value = loader()
+            cache.set(key, value, self.timeout)
+
+        self._local.set(name, value)
+        return value
+
+    def get_many_or_set(self, names, loader):
+        """
+        ``get_or_set`` for several names at once: one round trip to the shared
+        tier, then ``loader(missing_names)`` returns ``{name: value}`` for the
+        rest. Names the loader leaves out are not cached and not returned.
+        """
+        values = {}
+        for name in names:
+            value = self._local.get(name)
+            if value is not None:
+                values[name] = value
+        missing = [name for name in names if name not in values]
+        if not missing:
+            return values
+
+        prefix = f'{self.namespace}:{self.version()}:'
+        found = {key[len(prefix):]: value for key, value in cache.get_many([prefix + name for name in missing]).items()}
+        missing = [name for name in missing if name not in found]
+        if missing:
+            loaded = loader(missing)
+            cache.set_many({prefix + name: value for name, value in loaded.items()}, self.timeout)
+            found.update(loaded)
+
+        for name, value in found.items():
+            self._local.set(name, value)
+        values.update(found)
+        return values
+
+    def delete_many(self, names):
+        """
+        Drop ``names`` under the current version from the shared tier and this
+        process's local tier. Other processes may keep serving their local
+        copies for up to ``local_ttl`` seconds, as after ``invalidate``.
+        """
+        if not names:
+            return
+        prefix = f'{self.namespace}:{self.version()}:'
+        cache.delete_many([prefix + name for name in names])
+        for name in names:
+            self._local.delete(name)
+
+    def invalidate(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, time.time_ns(), None)
+        self._local.clear()
+
+
+def build_payload(data):
+    """
+    Wrap serialized data with a strong ETag computed once, when it is cached.
+    """
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return {'data': data, 'etag': quote_etag(hashlib.md5(body.encode()).hexdigest())}
+
+
+catalog_cache = TieredCache('catalog')
@@ -0,0 +1,38 @@
+"""
+Structured, level-gated diagnostics.
+
+Use ``event(logger, "login.failed", user_id=...)`` instead of ``print``. Nothing
+is formatted unless the logger is enabled for the level, and handlers using
+``StructuredFormatter`` write one JSON object per event. The ``api`` logger
+level comes from the API_LOG_LEVEL environment variable (see settings).
+Never pass passwords, tokens or OTP codes as fields.
+"""
+import json
+import logging
+
+
+def event(logger, name, level=logging.DEBUG, exc_info=False, **fields):
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(
+        level,
+        "%s %s",
+        name,
+        " ".join(f"{key}={value!r}" for key, value in fields.items()),
+        exc_info=exc_info,
+        extra={'event': name, 'fields': fields},
+    )
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None) or record.getMessage(),
+        }
+        payload.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
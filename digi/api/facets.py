@@ -0,0 +1,132 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import TieredCache
+from .models import FacetCount, Product
+
+facet_cache = TieredCache('facets')
+
+# Product fields that feed FacetCount, and their columns
+FACET_FIELDS = {'tags', 'category', 'sub_category'}
+FACET_COLUMNS = ['tags', 'category_id', 'sub_category_id']
+
+# (facet, value, count) rows for every facet of the products in ``filtered``
+FACET_COUNTS_SQL = """
+WITH filtered AS ({products})
+(SELECT 'tag', tag, count(*) FROM filtered, unnest(filtered.tags) AS tag
+ GROUP BY tag ORDER BY count(*) DESC, tag LIMIT %s)
+UNION ALL
+(SELECT 'category', category_id::text, count(*) FROM filtered GROUP BY category_id)
+UNION ALL
+(SELECT 'sub_category', sub_category_id::text, count(*) FROM filtered GROUP BY sub_category_id)
+"""
+
+
+def _tag_limit():
+    return getattr(settings, 'FACET_TAG_LIMIT', 50)
+
+
+def _group(rows):
+    facets = {"tag": [], "category": [], "sub_category": []}
+    for facet, value, count in rows:
+        facets[facet].append((value, count))
+    for values in facets.values():
+        values.sort(key=lambda item: (-item[1], item[0]))
+    return facets
+
+
+def facet_counts(queryset):
+    """
+    Facet counts for a filtered product queryset, in one aggregate query.
+    """
+    sql, params = queryset.order_by().values('tags', 'category_id', 'sub_category_id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(FACET_COUNTS_SQL.format(products=sql), [*params, _tag_limit()])
+        return _group(cursor.fetchall())
+
+
+def browse_facets():
+    """
+    Facet counts for the whole catalog, read from FacetCount.
+    """
+    def load():
+        limit = _tag_limit()
+        rows = list(
+            FacetCount.objects.filter(facet="tag", count__gt=0)
+            .order_by('-count', 'value').values_list('facet', 'value', 'count')[:limit]
+        )
+        rows += FacetCount.objects.filter(facet__in=["category", "sub_category"], count__gt=0).values_list(
+            'facet', 'value', 'count'
+        )
+        return _group(rows)
+
+    return facet_cache.get_or_set('browse', load)
+
+
+def product_facets(tags, category_id, sub_category_id):
+    counts = Counter(("tag", tag) for tag in set(tags or []))
+    if category_id is not None:
+        counts[("category", str(category_id))] += 1
+    if sub_category_id is not None:
+        counts[("sub_category", str(sub_category_id))] += 1
+    return counts
+
+
+def apply_deltas(deltas):
+    """
+    Add ``{(facet, value): delta}`` to FacetCount with atomic upserts.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = FacetCount._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (facet, value, count) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (facet, value) DO UPDATE SET count = {table}.count + EXCLUDED.count",
+            [(facet, value, delta) for (facet, value), delta in deltas.items()],
+        )
+        cursor.execute(f"DELETE FROM {table} WHERE count <= 0")
+    transaction.on_commit(facet_cache.invalidate)
+
+
+def count_products(ids, previous=None, batch_size=5000):
+    """
+    Apply the facet changes of a bulk write to the products in ``ids``.
+    ``previous`` maps the ids of rows that existed before the write to their
+    old column values; every other row counts as new. Only the written rows
+    are read, ``batch_size`` at a time.
+    """
+    previous = previous or {}
+    ids = sorted(set(ids))
+    deltas = Counter()
+    for start in range(0, len(ids), batch_size):
+        for row in Product.objects.filter(pk__in=ids[start:start + batch_size]).values('id', *FACET_COLUMNS):
+            deltas.update(product_facets(*(row[column] for column in FACET_COLUMNS)))
+            if row['id'] in previous:
+                old = {**row, **previous[row['id']]}
+                deltas.subtract(product_facets(*(old[column] for column in FACET_COLUMNS)))
+    apply_deltas(deltas)
+
+
+def rebuild_facet_counts():
+    """
+    Recount FacetCount from scratch, for the rebuild_facets command and for
+    bulk writes that cannot say which rows they changed. Upserts the fresh
+    counts and drops stale rows in one statement, so readers never see an
+    empty table.
+    """
+    sql, params = Product.objects.order_by().values('tags', 'category_id', 'sub_category_id').query.sql_with_params()
+    table = FacetCount._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH fresh (facet, value, count) AS ({FACET_COUNTS_SQL.format(products=sql)}), "
+            f"upserted AS (INSERT INTO {table} (facet, value, count) SELECT facet, value, count FROM fresh "
+            f"ON CONFLICT (facet, value) DO UPDATE SET count = EXCLUDED.count) "
+            f"DELETE FROM {table} WHERE NOT EXISTS "
+            f"(SELECT 1 FROM fresh WHERE fresh.facet = {table}.facet AND fresh.value = {table}.value)",
+            [*params, None],
+        )
+    transaction.on_commit(facet_cache.invalidate)
@@ -0,0 +1,58 @@
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+class CommaSeparatedField(serializers.ListField):
+    """
+    List field that also accepts a single comma separated string, which is how
+    lists arrive in query parameters (``?tags=a,b``).
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [item.strip() for item in data.split(',') if item.strip()]
+        return super().to_internal_value(data)
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Turns whitelisted query parameters into ORM lookups.
+
+    Views declare ``filter_fields`` as a mapping of query parameter name to a
+    ``(lookup, field)`` pair. ``field`` is a DRF serializer field used to parse
+    and validate the raw value, so a bad value is reported as a 400 instead of
+    reaching the database. Parameters that are not declared are ignored, and
+    each declared one is its own condition, even when two share a lookup.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filter_fields = getattr(view, 'filter_fields', {})
+        lookups = []
+        errors = {}
+
+        for param, (lookup, field) in filter_fields.items():
+            raw_value = request.query_params.get(param)
+            if raw_value in (None, ''):
+                continue
+            try:
+                lookups.append((lookup, field.run_validation(raw_value)))
+            except serializers.ValidationError as exc:
+                errors[param] = exc.detail
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        for lookup, value in lookups:
+            queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': param,
+                'required': False,
+                'in': 'query',
+                'description': f'Filter on {lookup}',
+                'schema': {'type': 'string'},
+            }
+            for param, (lookup, field) in getattr(view, 'filter_fields', {}).items()
+        ]
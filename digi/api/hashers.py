@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, check_password, get_hasher, identify_hasher, make_password
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 with cost parameters taken from settings (ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST, ARGON2_PARALLELISM) so they can be tuned per host
+    with ``manage.py benchmark_hasher``.
+
+    Existing hashes made with other parameters, or with an older hasher from
+    PASSWORD_HASHERS, are upgraded by ``check_password`` on the next
+    successful login.
+    """
+
+    @property
+    def time_cost(self):
+        return getattr(settings, 'ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hashing_executor():
+    """
+    Bounded pool for password hashing in async views. Hashing is CPU bound, so
+    PASSWORD_HASHING_WORKERS caps how many hashes run at once and keeps the
+    event loop free for other requests while they do.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 4),
+                thread_name_prefix='password-hashing',
+            )
+    return _executor
+
+
+async def amake_password(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hashing_executor(), make_password, password)
+
+
+async def acheck_password(user, password):
+    """
+    Async ``user.check_password``: verifies in the hashing pool and, like the
+    sync version, upgrades an outdated hash on success.
+    """
+    loop = asyncio.get_running_loop()
+    encoded = user.password
+    valid = await loop.run_in_executor(hashing_executor(), check_password, password, encoded)
+    if valid and _must_update(encoded):
+        user.password = await amake_password(password)
+        await user.asave(update_fields=['password'])
+    return valid
+
+
+def _must_update(encoded):
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = get_hasher('default')
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
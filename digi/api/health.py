@@ -0,0 +1,125 @@
+import logging
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import django
+import psutil
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class SystemSampler:
+    """
+    Samples CPU, memory, disk, database and storage health on a background
+    thread every ``interval`` seconds.
+
+    Health probes read the latest snapshot instead of measuring on the
+    request thread, so a probe never blocks on ``cpu_percent`` or on disk and
+    database round-trips. CPU usage is the average since the previous sample.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # The first call only sets the baseline that the first sample averages from
+            psutil.cpu_percent(interval=None)
+            self._thread = threading.Thread(target=self._run, name='health-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception:
+                # Keep sampling; probes serve the previous snapshot meanwhile
+                logger.exception("Health sample failed")
+            time.sleep(self.interval)
+
+    def snapshot(self):
+        """
+        Return the latest snapshot without waiting: ``None`` until the first
+        sample is in. Also (re)starts the sampler, e.g. in a worker forked
+        after the server process started it.
+        """
+        self.start()
+        return self._snapshot
+
+    def sample(self):
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        database_status = self._check_database()
+        storage_status = self._check_storage()
+
+        snapshot = {
+            "status": "healthy" if database_status == storage_status == "healthy" else "unhealthy",
+            "cpu": {
+                "cpu_count": psutil.cpu_count(),
+                "cpu_percent": psutil.cpu_percent(interval=None),
+            },
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "percent": memory.percent,
+                "used": memory.used,
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": disk.percent,
+            },
+            "database": {
+                "status": database_status,
+                "engine": settings.DATABASES['default']['ENGINE'],
+            },
+            "storage": {
+                "status": storage_status,
+            },
+            "sampled_at": timezone.now(),
+            "_monotonic": time.monotonic(),
+        }
+        self._snapshot = snapshot
+        return snapshot
+
+    def _check_database(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return "healthy"
+        except Exception as e:
+            return f"unhealthy: {str(e)}"
+        finally:
+            # Don't hold a connection open between samples
+            if threading.current_thread() is self._thread:
+                connection.close()
+
+    def _check_storage(self):
+        try:
+            with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT) as f:
+                f.write(b'test')
+            return "healthy"
+        except Exception as e:
+            return f"unhealthy: {str(e)}"
+
+
+SYSTEM_INFO = {
+    "os": platform.system(),
+    "os_version": platform.version(),
+    "python_version": sys.version,
+    "django_version": django.get_version(),
+}
+
+system_sampler = SystemSampler(interval=getattr(settings, 'HEALTH_SAMPLE_INTERVAL', 10))
@@ -0,0 +1,74 @@
+from django.utils import timezone
+
+from .models import Product, ProductListing, ProductRating
+from .pricing import best_discount, product_price
+
+LISTING_BATCH_SIZE = 1000
+
+# search_vector is left to the table's trigger
+UPDATE_FIELDS = [
+    field.name for field in ProductListing._meta.concrete_fields if not field.primary_key and field.editable
+]
+
+
+def listing_source(products, on=None):
+    """
+    Load ``products`` with everything a listing row needs: one row per
+    product, the best discount as a subquery and review totals from
+    ProductRating.
+    """
+    return products.select_related('category', 'sub_category', 'rating_summary').annotate(
+        best_discount=best_discount(on),
+    )
+
+
+def _listing(product, refreshed_at):
+    try:
+        rating = product.rating_summary
+    except ProductRating.DoesNotExist:
+        rating = ProductRating()
+    return ProductListing(
+        product_id=product.pk,
+        name=product.name,
+        description=product.description,
+        summary=product.summary,
+        img=product.img,
+        price=product.price,
+        effective_price=product_price(product.price, product.best_discount).effective_price,
+        tags=product.tags,
+        category_id=product.category_id,
+        category_name=product.category.name,
+        category_slug=product.category.slug,
+        sub_category_id=product.sub_category_id,
+        sub_category_name=product.sub_category.name,
+        sub_category_slug=product.sub_category.slug,
+        average_rating=rating.average,
+        review_count=rating.count,
+        star_counts=rating.stars,
+        refreshed_at=refreshed_at,
+    )
+
+
+def refresh_listings(products=None, batch_size=LISTING_BATCH_SIZE):
+    """
+    Recompute and upsert the listing rows for ``products`` (a Product
+    queryset, the whole catalog by default), walking it in id order in
+    batches. Returns the number of rows written.
+    """
+    products = Product.objects.all() if products is None else products
+    on = timezone.localdate()
+    refreshed_at = timezone.now()
+    written, last_id = 0, 0
+    while True:
+        batch = list(listing_source(products.filter(pk__gt=last_id), on).order_by('pk')[:batch_size])
+        if batch:
+            ProductListing.objects.bulk_create(
+                [_listing(product, refreshed_at) for product in batch],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=UPDATE_FIELDS,
+            )
+        written += len(batch)
+        if len(batch) < batch_size:
+            return written
+        last_id = batch[-1].pk
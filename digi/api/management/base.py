@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class BatchLoopCommand(BaseCommand):
+    """
+    A command that works through the database in batches, once or with
+    ``--loop`` until interrupted. Subclasses implement ``run_once`` and
+    return how much it did; the loop sleeps ``--interval`` seconds after a
+    run that found nothing to do.
+    """
+    batch_size = 1000
+    batch_size_help = 'Rows handled per batch'
+    interval = 60
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=self.batch_size, help=self.batch_size_help)
+        parser.add_argument('--loop', action='store_true', help='Keep running until interrupted')
+        parser.add_argument('--interval', type=float, default=self.interval,
+                            help='Seconds to sleep with --loop when there is nothing to do')
+
+    def handle(self, *args, **options):
+        while True:
+            done = self.run_once(options['batch_size'])
+            if not options['loop']:
+                break
+            if not done:
+                time.sleep(options['interval'])
+
+    def run_once(self, batch_size):
+        raise NotImplementedError('subclasses of BatchLoopCommand must provide a run_once() method')
@@ -0,0 +1,58 @@
+import time
+
+import argon2
+from django.core.management.base import BaseCommand
+
+from api.hashers import TunedArgon2PasswordHasher
+
+
+class Command(BaseCommand):
+    help = 'Measure Argon2 hashing time on this host and recommend ARGON2_* settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=50.0, help='Upper bound for one hash, in milliseconds')
+        parser.add_argument('--memory-cost', type=int, default=None, help='Memory per hash in KiB (default: current setting)')
+        parser.add_argument('--parallelism', type=int, default=None, help='Lanes per hash (default: current setting)')
+        parser.add_argument('--max-time-cost', type=int, default=10, help='Highest time cost to try')
+        parser.add_argument('--samples', type=int, default=5, help='Hashes timed per candidate')
+
+    def handle(self, *args, **options):
+        hasher = TunedArgon2PasswordHasher()
+        memory_cost = options['memory_cost'] or hasher.memory_cost
+        parallelism = options['parallelism'] or hasher.parallelism
+        target = options['target_ms']
+
+        self.stdout.write(
+            f"Current: time_cost={hasher.time_cost} memory_cost={hasher.memory_cost} "
+            f"parallelism={hasher.parallelism}"
+        )
+
+        recommended = None
+        for time_cost in range(1, options['max_time_cost'] + 1):
+            elapsed = self.measure(time_cost, memory_cost, parallelism, options['samples'])
+            self.stdout.write(f"time_cost={time_cost}: {elapsed:.1f} ms")
+            if elapsed > target:
+                break
+            recommended = (time_cost, elapsed)
+
+        if recommended is None:
+            self.stdout.write(self.style.WARNING(
+                f"Even time_cost=1 exceeds {target} ms; lower --memory-cost or raise --target-ms."
+            ))
+            return
+
+        time_cost, elapsed = recommended
+        self.stdout.write(self.style.SUCCESS(
+            f"Recommended ({elapsed:.1f} ms per hash, ~{1000 / elapsed:.0f} logins/s per worker):\n"
+            f"ARGON2_TIME_COST = {time_cost}\n"
+            f"ARGON2_MEMORY_COST = {memory_cost}\n"
+            f"ARGON2_PARALLELISM = {parallelism}"
+        ))
+
+    def measure(self, time_cost, memory_cost, parallelism, samples):
+        hasher = argon2.PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        hasher.hash('benchmark-password')  # warm up
+        start = time.perf_counter()
+        for _ in range(samples):
+            hasher.hash('benchmark-password')
+        return (time.perf_counter() - start) * 1000 / samples
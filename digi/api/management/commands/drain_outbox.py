@@ -0,0 +1,15 @@
+from api.management.base import BatchLoopCommand
+from api.outbox import drain
+
+
+class Command(BatchLoopCommand):
+    help = 'Deliver pending emails and SMS from the outbox'
+    batch_size = 100
+    batch_size_help = 'Messages claimed per batch'
+    interval = 1.0
+
+    def run_once(self, batch_size):
+        sent, retried, failed = drain(batch_size=batch_size)
+        if sent or retried or failed:
+            self.stdout.write(f"Sent {sent}, retrying {retried}, failed {failed}")
+        return sent + retried + failed
@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+import sys
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from api.facets import FACET_COLUMNS
+from api.models import Category, Product, SubCategory
+from api.serializers import ProductImportSerializer
+from api.signals import bulk_changed
+
+COLUMNS = ['sku', 'name', 'description', 'summary', 'price', 'img', 'category_id', 'sub_category_id', 'tags']
+UPDATE_FIELDS = ['name', 'description', 'summary', 'price', 'img', 'category', 'sub_category', 'tags']
+
+
+class Command(BaseCommand):
+    help = 'Import products from a CSV or NDJSON supplier feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Feed format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows validated and loaded per transaction')
+        parser.add_argument('--upsert', action='store_true', help='Update existing products matched on sku')
+        parser.add_argument('--method', choices=['bulk', 'copy'], default='bulk',
+                            help='Load with bulk_create, or with PostgreSQL COPY')
+        parser.add_argument('--max-errors', type=int, default=100, help='Invalid rows reported before giving up')
+
+    def handle(self, *args, **options):
+        if options['method'] == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('--method copy needs PostgreSQL')
+
+        fmt = options['format'] or ('ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'csv')
+        context = {
+            'categories': dict(Category.objects.values_list('slug', 'id')),
+            'sub_categories': {
+                (category_id, slug): pk
+                for pk, category_id, slug in SubCategory.objects.values_list('id', 'Category_id', 'slug')
+            },
+            'require_sku': options['upsert'],
+        }
+        validator = ProductImportSerializer(context=context)
+        load = self.copy if options['method'] == 'copy' else self.bulk_create
+
+        loaded = invalid = duplicates = 0
+        ids, written, previous = [], set(), {}
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            rows = self.read(stream, fmt)
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                valid = []
+                for line, row in chunk:
+                    try:
+                        if not isinstance(row, dict):
+                            raise serializers.ValidationError({'non_field_errors': ["Not a JSON object."]})
+                        valid.append(validator.run_validation(row))
+                    except serializers.ValidationError as exc:
+                        invalid += 1
+                        self.stderr.write(f"Line {line}: {json.dumps(exc.detail)}")
+                        if invalid >= options['max_errors']:
+                            raise CommandError(f"Stopped after {invalid} invalid rows; {loaded} rows loaded")
+                if options['upsert']:
+                    # ON CONFLICT cannot touch the same row twice in one statement
+                    valid = list({row['sku']: row for row in valid}.values())
+                with transaction.atomic():
+                    if options['upsert']:
+                        # Facet columns of the rows this chunk may overwrite,
+                        # unless an earlier chunk created them
+                        existing = Product.objects.select_for_update().filter(sku__in=[row['sku'] for row in valid])
+                        for row in existing.values('id', *FACET_COLUMNS):
+                            if row['id'] not in written:
+                                previous.setdefault(row.pop('id'), row)
+                    chunk_ids = load(valid, options['upsert'])
+                ids += chunk_ids
+                written.update(chunk_ids)
+                loaded += len(chunk_ids)
+                duplicates += len(valid) - len(chunk_ids)
+                self.stdout.write(f"Loaded {loaded} rows")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if ids:
+                bulk_changed.send(sender=Product, action="imported", ids=ids, previous=previous)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {loaded} products, skipped {duplicates} existing SKUs and {invalid} invalid rows"
+        ))
+
+    def read(self, stream, fmt):
+        """
+        Yield ``(line_number, row_dict)`` pairs.
+        """
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+
+    def bulk_create(self, rows, upsert):
+        """
+        Load ``rows`` and return the ids written. Without ``upsert`` rows
+        whose sku already exists are skipped.
+        """
+        if not upsert:
+            seen = set(Product.objects.filter(
+                sku__in=[row['sku'] for row in rows if row.get('sku')],
+            ).values_list('sku', flat=True))
+            fresh = []
+            for row in rows:
+                if row.get('sku'):
+                    if row['sku'] in seen:
+                        continue
+                    seen.add(row['sku'])
+                fresh.append(row)
+            rows = fresh
+        products = [
+            Product(
+                sku=row.get('sku'),
+                name=row['name'],
+                description=row.get('description'),
+                summary=row.get('summary'),
+                price=row.get('price'),
+                img=row.get('img'),
+                category_id=row['category'],
+                sub_category_id=row['sub_category'],
+                tags=row['tags'],
+            )
+            for row in rows
+        ]
+        if not upsert:
+            return [product.pk for product in Product.objects.bulk_create(products)]
+        # Upserted rows don't get their pks back, so look them up by sku
+        Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS)
+        return list(Product.objects.filter(sku__in=[product.sku for product in products]).values_list('id', flat=True))
+
+    def copy(self, rows, upsert):
+        """
+        COPY ``rows`` into a scratch table and merge it on sku in one
+        statement. Returns the ids written; without ``upsert`` rows whose sku
+        already exists are skipped.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                row.get('sku'), row['name'], row.get('description'), row.get('summary'), row.get('price'),
+                row.get('img'), row['category'], row['sub_category'], pg_array(row['tags']),
+            ])
+        buffer.seek(0)
+
+        table = Product._meta.db_table
+        columns = ', '.join(COLUMNS)
+        if upsert:
+            updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in COLUMNS if column != 'sku')
+            on_conflict = f"DO UPDATE SET {updates}"
+        else:
+            on_conflict = "DO NOTHING"
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE product_import AS SELECT {columns} FROM {table} WITH NO DATA")
+            cursor.copy_expert(f"COPY product_import ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM product_import "
+                f"ON CONFLICT (sku) {on_conflict} RETURNING id"
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DROP TABLE product_import")
+        return ids
+
+
+def pg_array(values):
+    """
+    Render a list of strings as a PostgreSQL array literal for COPY.
+    """
+    items = (value.replace('\\', '\\\\').replace('"', '\\"') for value in values)
+    return '{' + ','.join(f'"{item}"' for item in items) + '}'
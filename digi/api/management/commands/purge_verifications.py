@@ -0,0 +1,33 @@
+from django.utils import timezone
+
+from api.management.base import BatchLoopCommand
+from api.models import EmailVerification, SMSVerification
+
+
+class Command(BatchLoopCommand):
+    help = 'Delete expired, unused email and SMS verification rows'
+    batch_size = 5000
+    batch_size_help = 'Rows deleted per statement'
+    interval = 300
+
+    def run_once(self, batch_size):
+        total = 0
+        for model in (EmailVerification, SMSVerification):
+            deleted = self.purge(model, batch_size)
+            if deleted:
+                self.stdout.write(f"Deleted {deleted} expired {model.__name__} rows")
+            total += deleted
+        return total
+
+    def purge(self, model, batch_size):
+        # Small batches keep each DELETE short so verification requests are not blocked
+        total = 0
+        while True:
+            ids = list(
+                model.objects.filter(is_verified=False, expires_at__lt=timezone.now())
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return total
+            model.objects.filter(id__in=ids).delete()
+            total += len(ids)
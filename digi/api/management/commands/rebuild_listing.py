@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.listing import LISTING_BATCH_SIZE, refresh_listings
+
+
+class Command(BaseCommand):
+    help = 'Recompute every ProductListing row from products, discounts and reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=LISTING_BATCH_SIZE, help='Products recomputed per upsert')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        written = refresh_listings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} listing rows in {time.monotonic() - start:.1f}s"
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.listing import refresh_listings
+from api.models import Product
+from api.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-product review totals and fix any that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Product ids recomputed per statement')
+
+    def handle(self, *args, **options):
+        changed = reconcile_ratings(options['batch_size'])
+        if changed:
+            refresh_listings(Product.objects.filter(pk__in=changed))
+        self.stdout.write(self.style.SUCCESS(f"Fixed rating totals for {len(changed)} products"))
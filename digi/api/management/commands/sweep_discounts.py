@@ -0,0 +1,48 @@
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+
+from api.management.base import BatchLoopCommand
+from api.models import Discount
+from api.signals import bulk_changed
+
+
+class Command(BatchLoopCommand):
+    help = 'Switch discounts on and off at their start and end dates'
+    batch_size_help = 'Discounts updated per statement'
+
+    def run_once(self, batch_size):
+        today = timezone.localdate()
+        midnight = timezone.make_aware(datetime.combine(today, time.min))
+        steps = [
+            # Not started yet: off until start_date, remembered as scheduled
+            ("held", Q(active=True, start_date__gt=today), {'active': False, 'scheduled': True}),
+            # Held ones, and active ones opening today that were never held
+            # (created before today without a sweep in between) while their
+            # listing still has yesterday's price
+            ("started", (Q(scheduled=True) | Q(active=True, start_date=today, product__listing__refreshed_at__lt=midnight))
+             & Q(start_date__lte=today) & (Q(end_date__isnull=True) | Q(end_date__gte=today)),
+             {'active': True, 'scheduled': False}),
+            ("expired", (Q(active=True) | Q(scheduled=True)) & Q(end_date__lt=today),
+             {'active': False, 'scheduled': False}),
+        ]
+        total = 0
+        for label, condition, values in steps:
+            swept = self.sweep(condition, values, batch_size)
+            if swept:
+                self.stdout.write(f"{label.capitalize()} {swept} discounts")
+            total += swept
+        return total
+
+    def sweep(self, condition, values, batch_size):
+        # Short batches keep row locks brief; each one refreshes the prices
+        # and listings of its products through bulk_changed
+        total = 0
+        while True:
+            ids = list(Discount.objects.filter(condition).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            Discount.objects.filter(id__in=ids).update(**values)
+            bulk_changed.send(sender=Discount, action="updated", ids=ids, fields=sorted(values))
+            total += len(ids)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_rename_user_members_rename_user_productview_members'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sub_category', 'id'], name='product_subcategory_id_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='discount',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='discounts', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:44
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailverification',
+            name='token',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(condition=models.Q(('is_verified', False)), fields=['expires_at'], name='emailverif_pending_exp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smsverification',
+            index=models.Index(condition=models.Q(('is_verified', False)), fields=['user', 'phone_number', 'code'], name='smsverif_pending_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smsverification',
+            index=models.Index(condition=models.Q(('is_verified', False)), fields=['expires_at'], name='smsverif_pending_exp_idx'),
+        ),
+    ]
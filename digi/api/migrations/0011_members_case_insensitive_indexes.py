@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:46
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_verification_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='members',
+            index=models.Index(django.db.models.functions.text.Upper('username'), name='members_username_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='members',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='members_email_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:59
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# 'simple' keeps words as typed: catalog text is mixed Persian/English, which
+# no single stemming dictionary fits
+SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION api_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(array_to_string(NEW.tags, ' '), '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.summary, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_product_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, tags, summary, description ON api_product
+    FOR EACH ROW EXECUTE FUNCTION api_product_search_vector();
+
+-- Backfill existing rows through the trigger
+UPDATE api_product SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS api_product_search_vector_update ON api_product;
+DROP FUNCTION IF EXISTS api_product_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        # Typo-tolerant fallback matches product names by trigram word similarity
+        TrigramExtension(),
+        migrations.RunSQL(
+            "CREATE INDEX product_name_trgm_idx ON api_product USING gin (name gin_trgm_ops);",
+            "DROP INDEX IF EXISTS product_name_trgm_idx;",
+        ),
+    ]
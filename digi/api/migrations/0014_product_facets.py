@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:01
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('tag', 'Tag'), ('category', 'Category'), ('sub_category', 'Subcategory')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='product_tags_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facetcount',
+            index=models.Index(fields=['facet', '-count'], name='facetcount_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='facetcount_facet_value_uniq'),
+        ),
+        # Initial counts; signals keep them current from here on
+        migrations.RunSQL(
+            """
+            INSERT INTO api_facetcount (facet, value, count)
+            (SELECT 'tag', tag, count(*) FROM api_product, unnest(api_product.tags) AS tag GROUP BY tag)
+            UNION ALL
+            (SELECT 'category', category_id::text, count(*) FROM api_product GROUP BY category_id)
+            UNION ALL
+            (SELECT 'sub_category', sub_category_id::text, count(*) FROM api_product GROUP BY sub_category_id);
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:07
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_product_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='api.product')),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('img', models.CharField(blank=True, max_length=255, null=True)),
+                ('price', models.FloatField(blank=True, null=True)),
+                ('effective_price', models.FloatField(blank=True, null=True)),
+                ('tags', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, size=None)),
+                ('category_id', models.IntegerField()),
+                ('category_name', models.CharField(max_length=255)),
+                ('category_slug', models.SlugField(max_length=255)),
+                ('sub_category_id', models.IntegerField()),
+                ('sub_category_name', models.CharField(max_length=255)),
+                ('sub_category_slug', models.SlugField(max_length=255)),
+                ('average_rating', models.FloatField(blank=True, null=True)),
+                ('review_count', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category_slug', 'product'], name='listing_category_idx'), models.Index(fields=['sub_category_slug', 'product'], name='listing_subcategory_idx'), django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='listing_tags_idx')],
+            },
+        ),
+        # Initial rows; signals keep them current and rebuild_listing recomputes them
+        migrations.RunSQL(
+            """
+            INSERT INTO api_productlisting (
+                product_id, name, description, summary, img, price, effective_price, tags,
+                category_id, category_name, category_slug, sub_category_id, sub_category_name, sub_category_slug,
+                average_rating, review_count, refreshed_at
+            )
+            SELECT p.id, p.name, p.description, p.summary, p.img, p.price,
+                   CASE WHEN d.best > 0
+                        THEN round((p.price * (100 - least(d.best, 100)) / 100)::numeric, 2)::double precision
+                        ELSE p.price END,
+                   p.tags, c.id, c.name, c.slug, s.id, s.name, s.slug, r.average, coalesce(r.total, 0), now()
+            FROM api_product p
+            JOIN api_category c ON c.id = p.category_id
+            JOIN api_subcategory s ON s.id = p.sub_category_id
+            LEFT JOIN (
+                SELECT product_id, max(discount_percentage) AS best FROM api_discount
+                WHERE active AND user_id IS NULL
+                  AND (start_date IS NULL OR start_date <= CURRENT_DATE)
+                  AND (end_date IS NULL OR end_date >= CURRENT_DATE)
+                GROUP BY product_id
+            ) d ON d.product_id = p.id
+            LEFT JOIN (
+                SELECT product_id, avg(rating) AS average, count(*) AS total FROM api_review GROUP BY product_id
+            ) r ON r.product_id = p.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_product_listing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discount',
+            name='scheduled',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(condition=models.Q(('active', True)), fields=['product'], name='discount_live_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(condition=models.Q(('active', True), ('user__isnull', False)), fields=['user'], name='discount_live_user_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:17
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_discount_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='api.product')),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('star_1', models.IntegerField(default=0)),
+                ('star_2', models.IntegerField(default=0)),
+                ('star_3', models.IntegerField(default=0)),
+                ('star_4', models.IntegerField(default=0)),
+                ('star_5', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='star_counts',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=5),
+        ),
+        # Initial totals; reviews keep them current and reconcile_ratings recomputes them
+        migrations.RunSQL(
+            """
+            INSERT INTO api_productrating (product_id, count, total, star_1, star_2, star_3, star_4, star_5)
+            SELECT product_id, count(*), sum(rating),
+                   count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2),
+                   count(*) FILTER (WHERE rating = 3), count(*) FILTER (WHERE rating = 4),
+                   count(*) FILTER (WHERE rating = 5)
+            FROM api_review GROUP BY product_id;
+
+            UPDATE api_productlisting l
+            SET star_counts = ARRAY[r.star_1, r.star_2, r.star_3, r.star_4, r.star_5]
+            FROM api_productrating r WHERE r.product_id = l.product_id;
+            UPDATE api_productlisting SET star_counts = '{0,0,0,0,0}' WHERE star_counts = '{}';
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
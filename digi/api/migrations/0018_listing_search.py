@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:33
+
+from importlib import import_module
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+product_search = import_module('api.migrations.0013_product_search')
+
+# Search moves from api_product to the listing table; same weights and
+# 'simple' configuration as migration 0013
+SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION api_productlisting_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(array_to_string(NEW.tags, ' '), '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.summary, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_productlisting_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, tags, summary, description ON api_productlisting
+    FOR EACH ROW EXECUTE FUNCTION api_productlisting_search_vector();
+
+-- Backfill existing rows through the trigger
+UPDATE api_productlisting SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS api_productlisting_search_vector_update ON api_productlisting;
+DROP FUNCTION IF EXISTS api_productlisting_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_product_rating'),
+    ]
+
+    operations = [
+        migrations.RunSQL(product_search.DROP_SEARCH_VECTOR_TRIGGER, product_search.SEARCH_VECTOR_TRIGGER),
+        migrations.RunSQL(
+            "DROP INDEX IF EXISTS product_name_trgm_idx;",
+            "CREATE INDEX product_name_trgm_idx ON api_product USING gin (name gin_trgm_ops);",
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_search_vector_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='search_vector',
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='productlisting',
+            name='category_id',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='productlisting',
+            name='sub_category_id',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='listing_search_vector_idx'),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        # Typo-tolerant fallback matches listing names by trigram word similarity
+        migrations.RunSQL(
+            "CREATE INDEX listing_name_trgm_idx ON api_productlisting USING gin (name gin_trgm_ops);",
+            "DROP INDEX IF EXISTS listing_name_trgm_idx;",
+        ),
+    ]
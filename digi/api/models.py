@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 from django.utils.timezone import now
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import Group, Permission
 import uuid
 from django.utils.timezone import now
@@ -24,6 +28,14 @@ class members(AbstractUser):
     groups = None
     user_permissions = None
 
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        indexes = [
+            # Login looks users up with __iexact, which PostgreSQL compiles to UPPER()
+            models.Index(Upper('username'), name='members_username_upper_idx'),
+            models.Index(Upper('email'), name='members_email_upper_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -38,11 +50,21 @@ def sms_verification_expiry():
 class EmailVerification(models.Model):
     user = models.ForeignKey('members', on_delete=models.CASCADE, related_name="email_verifications")
     email = models.EmailField()  # Verification email
-    token = models.UUIDField(default=uuid.uuid4, editable=False)
+    token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(default=email_verification_expiry)
 
+    class Meta:
+        indexes = [
+            # Lets purge_verifications find expired, unused rows without a scan
+            models.Index(
+                fields=['expires_at'],
+                name='emailverif_pending_exp_idx',
+                condition=models.Q(is_verified=False),
+            ),
+        ]
+
     def is_expired(self):
         return now() > self.expires_at
 
@@ -58,6 +80,21 @@ class SMSVerification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(default=sms_verification_expiry)
 
+    class Meta:
+        indexes = [
+            # OTPs are only unique per user and phone, so they are looked up by all three
+            models.Index(
+                fields=['user', 'phone_number', 'code'],
+                name='smsverif_pending_lookup_idx',
+                condition=models.Q(is_verified=False),
+            ),
+            models.Index(
+                fields=['expires_at'],
+                name='smsverif_pending_exp_idx',
+                condition=models.Q(is_verified=False),
+            ),
+        ]
+
     def is_expired(self):
         return now() > self.expires_at
 
@@ -67,6 +104,42 @@ class SMSVerification(models.Model):
 
 
 
+class OutboxMessage(models.Model):
+    """
+    An email or SMS waiting to be delivered by the ``drain_outbox`` worker.
+    """
+    CHANNEL_CHOICES = [
+        ("email", "Email"),
+        ("sms", "SMS"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)  # Also the lease while a worker holds the row
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_due_idx',
+                condition=models.Q(status="pending"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
 
 class Address(models.Model):
     user = models.ForeignKey(members, on_delete=models.CASCADE, related_name='addresses')
@@ -78,6 +151,10 @@ class Address(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='address_user_created_idx'),
+        ]
 
     def __str__(self):
         return self.Address
@@ -107,7 +184,8 @@ class SubCategory(models.Model):
 class Product(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
-    #sku = models.textField(null=True, blank=True)
+    # Supplier SKU; import_products upserts on it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     summary = models.TextField(null=True, blank=True)
     price = models.FloatField(null=True, blank=True)
     img = models.CharField(max_length=255, null=True, blank=True)
@@ -115,7 +193,14 @@ class Product(models.Model):
     sub_category = models.ForeignKey(SubCategory, on_delete=models.CASCADE, related_name="sub_categories")
     tags = ArrayField(models.CharField(max_length=50), blank=True, default=list)
 
-
+    class Meta:
+        indexes = [
+            # Keyset pages filtered by category/subcategory walk these in id order
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+            models.Index(fields=['sub_category', 'id'], name='product_subcategory_id_idx'),
+            # Serves ?tags= (@> for all, && for any) and tag facet filters
+            GinIndex(fields=['tags'], name='product_tags_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -129,18 +214,91 @@ class Product_Images_Descriptions(models.Model):
     def __str__(self):
         return self.product_Images_Description
 
+class FacetCount(models.Model):
+    """
+    Product counts per tag, category and subcategory over the whole catalog,
+    kept current by signals (see api/facets.py) so unfiltered browse pages
+    read facets without aggregating products.
+    """
+    FACETS = [("tag", "Tag"), ("category", "Category"), ("sub_category", "Subcategory")]
+
+    facet = models.CharField(max_length=20, choices=FACETS)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='facetcount_facet_value_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['facet', '-count'], name='facetcount_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+class ProductListing(models.Model):
+    """
+    Denormalized read model behind the product list and search: product
+    fields with category and subcategory names, the current public price and
+    review stats in one row, kept in sync by signals (see api/listing.py) and
+    rebuilt with ``manage.py rebuild_listing``.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="listing")
+    name = models.CharField(max_length=255)
+    description = models.TextField(null=True, blank=True)
+    summary = models.TextField(null=True, blank=True)
+    img = models.CharField(max_length=255, null=True, blank=True)
+    price = models.FloatField(null=True, blank=True)
+    effective_price = models.FloatField(null=True, blank=True)  # After the best discount open to everyone
+    tags = ArrayField(models.CharField(max_length=50), blank=True, default=list)
+    category_id = models.BigIntegerField()
+    category_name = models.CharField(max_length=255)
+    category_slug = models.SlugField(max_length=255)
+    sub_category_id = models.BigIntegerField()
+    sub_category_name = models.CharField(max_length=255)
+    sub_category_slug = models.SlugField(max_length=255)
+    average_rating = models.FloatField(null=True, blank=True)
+    review_count = models.IntegerField(default=0)
+    star_counts = ArrayField(models.IntegerField(), size=5, default=list)  # Reviews with 1..5 stars
+    refreshed_at = models.DateTimeField(default=now)
+    # Weighted name (A), tags (B), summary (C), description (D); kept up to
+    # date by a database trigger (migration 0018), so upserts are covered
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category_slug', 'product'], name='listing_category_idx'),
+            models.Index(fields=['sub_category_slug', 'product'], name='listing_subcategory_idx'),
+            GinIndex(fields=['tags'], name='listing_tags_idx'),
+            GinIndex(fields=['search_vector'], name='listing_search_vector_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
 class Discount(models.Model):
-    user = models.ForeignKey(members, on_delete=models.CASCADE, related_name="discounts")  # Relationship to the user
+    user = models.ForeignKey(members, on_delete=models.CASCADE, null=True, blank=True, related_name="discounts")  # Personal discount; null applies to everyone
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="discounts")  # Relationship to the product
     description = models.TextField(null=True, blank=True)
     discount_percentage = models.FloatField(null=True, blank=True)
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     active = models.BooleanField(default=True)
+    # Switched off by sweep_discounts until start_date comes; the sweeper switches it back on
+    scheduled = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(default=now)
 
-
-
+    class Meta:
+        indexes = [
+            # Price lookups only read live discounts, a small share of the table
+            models.Index(fields=['product'], condition=models.Q(active=True), name='discount_live_product_idx'),
+            models.Index(
+                fields=['user'], condition=models.Q(active=True, user__isnull=False), name='discount_live_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.discount_percentage}%"
@@ -153,7 +311,15 @@ class Wishlist(models.Model):
     created_at = models.DateTimeField(default=now)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
-
+    class Meta:
+        indexes = [
+            # "My wishlist" only ever reads live items
+            models.Index(
+                fields=['user', '-created_at'],
+                name='wishlist_user_live_idx',
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
 
 
 class Payment(models.Model):
@@ -162,7 +328,10 @@ class Payment(models.Model):
     models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
-
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+        ]
 
     def __str__(self):
         return self.Payment_type
@@ -181,7 +350,10 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
-
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_id} - {self.status}"
@@ -190,10 +362,64 @@ class Order(models.Model):
         """
         Calculates the total amount of the order based on its items.
         """
-        self.total_amount = sum(
-            item.total_price for item in self.items.all()
-        )  # Related name for OrderItem is 'items'
-        self.save()
+        # One SUM in the database instead of loading every item
+        self.total_amount = self.items.aggregate(total=Sum('total_price'))['total'] or 0.0
+        self.save(update_fields=['total_amount', 'modified_at'])
+
+    def add_items(self, items):
+        """
+        Adds many items to the order at once.
+
+        ``items`` is an iterable of dicts with ``product`` (a Product or its id),
+        ``quantity`` and an optional unit ``price``, which only server-side
+        callers that already priced the line (checkout) may pass. Missing
+        prices are the effective prices the order's user pays, discounts
+        included, as at checkout. The items are inserted with a single
+        ``bulk_create`` and the total is recalculated once, all in one
+        transaction. Only pending orders take new items. Returns the created
+        OrderItem objects.
+        """
+        # pricing imports the models
+        from .pricing import effective_prices
+
+        if self.status != "pending":
+            raise ValueError(f"Items can only be added to pending orders, not {self.status} ones")
+        items = [
+            {**item, 'product': item['product'].pk if isinstance(item['product'], Product) else item['product']}
+            for item in items
+        ]
+        product_ids = {item['product'] for item in items}
+        unpriced_ids = {item['product'] for item in items if item.get('price') is None}
+        prices = effective_prices(unpriced_ids, user=self.user) if unpriced_ids else {}
+        known = set(prices)
+        if product_ids - unpriced_ids:
+            known.update(Product.objects.filter(id__in=product_ids - unpriced_ids).values_list('id', flat=True))
+        unknown = product_ids - known
+        if unknown:
+            raise Product.DoesNotExist(f"Unknown product ids: {sorted(unknown)}")
+
+        order_items = []
+        for item in items:
+            product_id = item['product']
+            quantity = item.get('quantity', 1)
+            price = item.get('price')
+            if price is None:
+                price = prices[product_id].effective_price
+            if price is None:
+                raise ValueError(f"Product {product_id} has no price")
+            order_items.append(OrderItem(
+                order=self,
+                product_id=product_id,
+                quantity=quantity,
+                price=price,
+                total_price=quantity * price,
+            ))
+
+        with transaction.atomic():
+            # bulk_create skips OrderItem.save(), so the total is only computed once
+            created = OrderItem.objects.bulk_create(order_items)
+            self.calculate_total()
+        return created
 
 
 class OrderItem(models.Model):
@@ -247,6 +473,32 @@ class Review(models.Model):
     def __str__(self):
         return f"Review for {self.product.name} by {self.user.username}"
 
+
+class ProductRating(models.Model):
+    """
+    Running review totals per product, updated in the same transaction as
+    the review (see api/ratings.py) and recomputed by ``reconcile_ratings``.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="rating_summary")
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)  # Sum of ratings
+    star_1 = models.IntegerField(default=0)
+    star_2 = models.IntegerField(default=0)
+    star_3 = models.IntegerField(default=0)
+    star_4 = models.IntegerField(default=0)
+    star_5 = models.IntegerField(default=0)
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 2) if self.count else None
+
+    @property
+    def stars(self):
+        return [self.star_1, self.star_2, self.star_3, self.star_4, self.star_5]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.average} ({self.count})"
+
 class AuditLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     action = models.CharField(max_length=50)
@@ -256,7 +508,12 @@ class AuditLog(models.Model):
     details = models.JSONField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
-
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'record_id'], name='auditlog_record_idx'),
+            models.Index(fields=['action'], name='auditlog_action_idx'),
+            models.Index(fields=['timestamp'], name='auditlog_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.action} by {self.members} on {self.model_name} ({self.record_id})"
@@ -0,0 +1,142 @@
+import json
+import logging
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(recipient, subject, body):
+    return OutboxMessage.objects.create(channel="email", recipient=recipient, subject=subject, body=body)
+
+
+def enqueue_sms(recipient, body):
+    return OutboxMessage.objects.create(channel="sms", recipient=recipient, body=body)
+
+
+def send_email(message):
+    send_mail(message.subject, message.body, settings.DEFAULT_FROM_EMAIL, [message.recipient])
+
+
+def send_sms(message):
+    gateway_url = getattr(settings, 'SMS_GATEWAY_URL', None)
+    if not gateway_url:
+        # No gateway configured (development): log instead of sending. The
+        # body carries the OTP, so only the recipient and message id are logged
+        logger.info("SMS %s to %s not sent: SMS_GATEWAY_URL is not set", message.id, message.recipient)
+        return
+    request = urllib.request.Request(
+        gateway_url,
+        data=json.dumps({"to": message.recipient, "text": message.body}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=settings.SMS_GATEWAY_TIMEOUT) as response:
+        if response.status >= 300:
+            raise RuntimeError(f"SMS gateway answered {response.status}")
+
+
+SENDERS = {
+    "email": send_email,
+    "sms": send_sms,
+}
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to ``batch_size`` due messages to this worker.
+
+    Rows are locked with SKIP LOCKED so several workers can drain in parallel,
+    and their ``next_attempt_at`` is pushed out by the lease period. If the
+    worker dies mid-batch the rows become due again, until they have used up
+    ``OUTBOX_MAX_ATTEMPTS``; such rows are marked failed here instead.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        abandoned = OutboxMessage.objects.filter(
+            status="pending", next_attempt_at__lte=now, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS,
+        ).update(status="failed", last_error=Coalesce('last_error', Value("lease expired")))
+        if abandoned:
+            logger.warning("Gave up on %s outbox messages whose worker never reported back", abandoned)
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if messages:
+            OutboxMessage.objects.filter(id__in=[m.id for m in messages]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+            )
+    for message in messages:
+        message.attempts += 1
+    return messages
+
+
+def _deliver(message):
+    try:
+        SENDERS[message.channel](message)
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+
+def drain(batch_size=100):
+    """
+    Deliver one batch of due messages. Each channel gets its own thread pool
+    sized by ``OUTBOX_CONCURRENCY`` so a slow provider cannot starve the
+    others. Returns ``(sent, retried, failed)`` counts.
+    """
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0, 0
+
+    by_channel = {}
+    for message in messages:
+        by_channel.setdefault(message.channel, []).append(message)
+
+    executors = []
+    futures = []
+    for channel, channel_messages in by_channel.items():
+        executor = ThreadPoolExecutor(max_workers=settings.OUTBOX_CONCURRENCY.get(channel, 1))
+        executors.append(executor)
+        futures.extend((message, executor.submit(_deliver, message)) for message in channel_messages)
+    results = [(message, future.result()) for message, future in futures]
+    for executor in executors:
+        executor.shutdown()
+
+    now = timezone.now()
+    sent_ids = [message.id for message, error in results if error is None]
+    retried, failed = [], []
+    for message, error in results:
+        if error is None:
+            continue
+        message.last_error = error
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = "failed"
+            failed.append(message)
+        else:
+            backoff = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (message.attempts - 1)
+            message.next_attempt_at = now + timedelta(seconds=backoff)
+            retried.append(message)
+        logger.warning("Outbox message %s to %s failed (attempt %s): %s",
+                       message.id, message.recipient, message.attempts, error)
+
+    if sent_ids:
+        OutboxMessage.objects.filter(id__in=sent_ids).update(
+            # Verification codes are not kept once delivered
+            status="sent", sent_at=now, last_error=None, body="",
+        )
+    if retried or failed:
+        OutboxMessage.objects.bulk_update(retried + failed, ['status', 'next_attempt_at', 'last_error'])
+    return len(sent_ids), len(retried), len(failed)
@@ -0,0 +1,157 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination over ``Product.id``.
+
+    Each page is a single ``WHERE id > <cursor> ORDER BY id LIMIT n`` query,
+    so the cost of a page does not depend on how deep into the catalog it is.
+    """
+    ordering = 'id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ListingCursorPagination(ProductCursorPagination):
+    """
+    The same keyset pages over ``ProductListing``, whose key is the product id.
+    """
+    ordering = 'product_id'
+
+
+class ListCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+
+class ListPagination(LimitOffsetPagination):
+    """
+    Default pagination for list endpoints.
+
+    Pages with ``?limit=``/``?offset=`` unless the client passes ``?cursor=``
+    (empty for the first page), in which case the list is keyset paginated
+    with the view's ordering. Cursor pages skip the ``COUNT(*)`` and stay
+    cheap however deep the client goes.
+    """
+    max_limit = 200
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = ListCursorPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        cursor_parameters = [
+            parameter for parameter in ListCursorPagination().get_schema_operation_parameters(view)
+            if parameter['name'] == self.cursor_query_param
+        ]
+        return super().get_schema_operation_parameters(view) + cursor_parameters
+
+
+class RankedKeysetPagination(BasePagination):
+    """
+    Keyset pagination for querysets annotated with a float ``rank``, ordered by
+    ``(rank, pk)`` descending.
+
+    The cursor carries the last row's exact rank and primary key, plus any extra state
+    the view wants to keep between pages (``view.cursor_state``), such as
+    which search mode produced the first page.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            float(cursor['rank'])
+            int(cursor['id'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, cursor):
+        encoded = urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.state = getattr(view, 'cursor_state', {})
+        try:
+            page_size = _positive_int(
+                request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            page_size = self.page_size
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(
+                Q(rank__lt=cursor['rank']) | Q(rank=cursor['rank'], pk__lt=cursor['id'])
+            )
+        rows = list(queryset.order_by('-rank', '-pk')[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor({**self.state, 'rank': last.rank, 'id': last.pk})
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor taken from the previous page\'s next link',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Items per page (max {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,136 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .cache import TieredCache
+from .models import Discount, Product
+
+# What a shopper pays for one unit: the list price, the best discount
+# percentage that applies (None without one) and the price after it
+ProductPrice = namedtuple('ProductPrice', ['price', 'discount_percentage', 'effective_price'])
+
+# Entries are bucketed by day, so discounts starting or ending at midnight
+# are picked up without an invalidation; changes to discounts and product
+# prices drop the affected entries (see forget_prices and api/signals.py).
+price_cache = TieredCache(
+    'prices',
+    timeout=getattr(settings, 'PRICE_CACHE_TIMEOUT', 24 * 60 * 60),
+    local_size=getattr(settings, 'PRICE_CACHE_LOCAL_SIZE', 10000),
+)
+
+
+def _running(on):
+    return Discount.objects.filter(active=True).filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=on),
+        Q(end_date__isnull=True) | Q(end_date__gte=on),
+    )
+
+
+def applicable_discounts(user=None, on=None):
+    """
+    Discounts that apply on the given day (today by default). Discounts without
+    a user apply to everybody; personal ones only to their user.
+    """
+    discounts = _running(on or timezone.localdate())
+    if user is not None and user.is_authenticated:
+        return discounts.filter(Q(user__isnull=True) | Q(user_id=user.pk))
+    return discounts.filter(user__isnull=True)
+
+
+def best_discount(on=None):
+    """
+    Subquery for the best public discount percentage of ``OuterRef('pk')``,
+    for annotating Product querysets.
+    """
+    return Subquery(
+        applicable_discounts(on=on)
+        .filter(product=OuterRef('pk'), discount_percentage__gt=0)
+        .order_by().values('product').annotate(best=Max('discount_percentage')).values('best')
+    )
+
+
+def discounted_price(price, percentage):
+    if price is None or not percentage:
+        return price
+    return round(price * (100 - percentage) / 100, 2)
+
+
+def product_price(price, percentage):
+    percentage = min(percentage, 100.0) if percentage and percentage > 0 else None
+    return ProductPrice(price, percentage, discounted_price(price, percentage))
+
+
+def forget_prices(product_ids=(), user_ids=()):
+    """
+    Drop the cached public prices of ``product_ids`` and the personal
+    discounts of ``user_ids`` for yesterday, today and tomorrow, which covers
+    workers on either side of midnight. Other days are only priced with an
+    explicit ``on`` and age out with PRICE_CACHE_TIMEOUT. The entries are
+    dropped once the current transaction commits.
+    """
+    today = timezone.localdate()
+    days = [(today + timedelta(days=offset)).isoformat() for offset in (-1, 0, 1)]
+    names = (
+        [f'{day}:{pk}' for day in days for pk in product_ids]
+        + [f'{day}:user:{pk}' for day in days for pk in user_ids]
+    )
+    if names:
+        transaction.on_commit(lambda: price_cache.delete_many(names))
+
+
+def personal_discounts(user, on=None):
+    """
+    ``{product_id: percentage}`` of the discounts only ``user`` gets, cached
+    per user and day. Usually empty, and then costs nothing after the first call.
+    """
+    if user is None or not user.is_authenticated:
+        return {}
+    on = on or timezone.localdate()
+
+    def load():
+        rows = (
+            _running(on)
+            .filter(user_id=user.pk, discount_percentage__gt=0)
+            .values('product_id').annotate(best=Max('discount_percentage'))
+        )
+        return {row['product_id']: min(row['best'], 100.0) for row in rows}
+
+    return price_cache.get_or_set(f'{on.isoformat()}:user:{user.pk}', load)
+
+
+def with_personal_discount(price, percentage):
+    """
+    Apply a personal discount on top of ``price`` (a ProductPrice) when it
+    beats the public one.
+    """
+    if not percentage or (price.discount_percentage or 0) >= percentage:
+        return price
+    return product_price(price.price, percentage)
+
+
+def effective_prices(product_ids, user=None, on=None):
+    """
+    ``{product_id: ProductPrice}`` for a batch of products as seen by
+    ``user`` (anonymous by default). Public prices are cached per product and
+    day; on a miss the missing products are priced in one query, and personal
+    discounts cost at most one more. Unknown products are left out.
+    """
+    on = on or timezone.localdate()
+    names = {f'{on.isoformat()}:{pk}': pk for pk in set(product_ids)}
+
+    def load(missing):
+        rows = (
+            Product.objects.filter(id__in=[names[name] for name in missing])
+            .annotate(best=best_discount(on)).values_list('id', 'price', 'best')
+        )
+        return {f'{on.isoformat()}:{pk}': product_price(price, best) for pk, price, best in rows}
+
+    personal = personal_discounts(user, on)
+    return {
+        names[name]: with_personal_discount(ProductPrice(*price), personal.get(names[name]))
+        for name, price in price_cache.get_many_or_set(list(names), load).items()
+    }
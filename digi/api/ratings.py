@@ -0,0 +1,79 @@
+from collections import Counter
+
+from django.db import connection
+
+from .models import ProductRating, Review
+
+STAR_FIELDS = [f'star_{stars}' for stars in range(1, 6)]
+COUNTER_FIELDS = ['count', 'total', *STAR_FIELDS]
+
+# Fresh totals for every product with reviews whose id is in (%s, %s]
+RATING_TOTALS_SQL = f"""
+SELECT product_id, count(*), coalesce(sum(rating), 0),
+       {', '.join(f'count(*) FILTER (WHERE rating = {stars})' for stars in range(1, 6))}
+FROM {Review._meta.db_table}
+WHERE product_id > %s AND product_id <= %s
+GROUP BY product_id
+"""
+
+
+def rating_delta(product_id, rating, sign=1):
+    """
+    ``{product_id: Counter}`` adding (or with ``sign=-1`` removing) one review.
+    """
+    return {product_id: Counter({'count': sign, 'total': sign * rating, f'star_{rating}': sign})}
+
+
+def apply_rating_deltas(deltas):
+    """
+    Add ``{product_id: Counter}`` to ProductRating with one upsert per
+    product. Run it in the transaction that writes the reviews.
+    """
+    rows = [
+        (product_id, *(delta[field] for field in COUNTER_FIELDS))
+        for product_id, delta in deltas.items() if any(delta.values())
+    ]
+    if not rows:
+        return []
+    table = ProductRating._meta.db_table
+    columns = ', '.join(COUNTER_FIELDS)
+    updates = ', '.join(f"{field} = {table}.{field} + EXCLUDED.{field}" for field in COUNTER_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (product_id, {columns}) VALUES (%s, {', '.join(['%s'] * len(COUNTER_FIELDS))}) "
+            f"ON CONFLICT (product_id) DO UPDATE SET {updates}",
+            rows,
+        )
+    return [row[0] for row in rows]
+
+
+def reconcile_ratings(batch_size=10000):
+    """
+    Recompute ProductRating from the reviews, ``batch_size`` product ids per
+    statement. Only rows that drifted are written; returns their product ids.
+    """
+    table = ProductRating._meta.db_table
+    columns = ', '.join(COUNTER_FIELDS)
+    excluded = ', '.join(f"EXCLUDED.{field}" for field in COUNTER_FIELDS)
+    current = ', '.join(f"{table}.{field}" for field in COUNTER_FIELDS)
+    changed = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT coalesce(max(product_id), 0) FROM (SELECT product_id FROM {Review._meta.db_table} "
+            f"UNION ALL SELECT product_id FROM {table}) ids"
+        )
+        last_id = cursor.fetchone()[0]
+        for start in range(0, last_id, batch_size):
+            end = start + batch_size
+            cursor.execute(
+                f"WITH fresh AS ({RATING_TOTALS_SQL}), "
+                f"upserted AS (INSERT INTO {table} (product_id, {columns}) SELECT * FROM fresh "
+                f"ON CONFLICT (product_id) DO UPDATE SET ({columns}) = ({excluded}) "
+                f"WHERE ({current}) IS DISTINCT FROM ({excluded}) RETURNING product_id), "
+                f"emptied AS (DELETE FROM {table} WHERE product_id > %s AND product_id <= %s "
+                f"AND NOT EXISTS (SELECT 1 FROM fresh WHERE fresh.product_id = {table}.product_id) RETURNING product_id) "
+                f"SELECT product_id FROM upserted UNION ALL SELECT product_id FROM emptied",
+                [start, end, start, end],
+            )
+            changed += [row[0] for row in cursor.fetchall()]
+    return changed
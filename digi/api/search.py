@@ -0,0 +1,37 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+# Must match the configuration used by the search_vector trigger (migration 0018)
+SEARCH_CONFIG = 'simple'
+
+
+def full_text_matches(queryset, text):
+    """
+    Listings whose search vector matches ``text`` (web search syntax: quoted
+    phrases, ``or``, ``-word``), annotated with their weighted ``rank``.
+
+    The rank is cast from real to double precision so it survives the round
+    trip through a pagination cursor exactly.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+    )
+
+
+def fuzzy_matches(queryset, text):
+    """
+    Typo-tolerant fallback: listings whose name contains a word similar to
+    ``text`` (pg_trgm ``%>``, served by the trigram index on ``name``),
+    ranked by that similarity.
+    """
+    return queryset.filter(name__trigram_word_similar=text).annotate(
+        rank=Cast(TrigramWordSimilarity(text, 'name'), FloatField()),
+    )
+
+
+SEARCH_MODES = {
+    'text': full_text_matches,
+    'fuzzy': fuzzy_matches,
+}
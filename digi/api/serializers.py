@@ -1,11 +1,74 @@
+import logging
+
 from django.contrib.auth import get_user_model, authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from .tokens import RefreshToken
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from .models import *
 from .models import EmailVerification
-from django.core.mail import send_mail
+from .outbox import enqueue_email, enqueue_sms
 from .models import SMSVerification
 from random import randint
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .pricing import effective_prices
+from .diagnostics import event
+from .filters import CommaSeparatedField
+
+auth_logger = logging.getLogger('api.auth')
+
+IDENTITY_CONFLICT_MESSAGES = {
+    "username": "This username is already taken. Please choose another one.",
+    "phone_number": "This phone number is already registered. Please use another one.",
+    "email": "This email is already registered. Please use another one.",
+}
+
+
+def _identity_condition(username, phone_number, email):
+    condition = Q()
+    if username:
+        condition |= Q(username__iexact=username)
+    if phone_number:
+        condition |= Q(phone_number=phone_number)
+    if email:
+        condition |= Q(email__iexact=email)
+    return condition
+
+
+def _identity_conflicts(rows, username, phone_number, email):
+    conflicts = {}
+    for row in rows:
+        if username and row['username'].lower() == username.lower():
+            conflicts['username'] = IDENTITY_CONFLICT_MESSAGES['username']
+        if phone_number and row['phone_number'] == phone_number:
+            conflicts['phone_number'] = IDENTITY_CONFLICT_MESSAGES['phone_number']
+        if email and row['email'].lower() == email.lower():
+            conflicts['email'] = IDENTITY_CONFLICT_MESSAGES['email']
+    return conflicts
+
+
+def find_identity_conflicts(username=None, phone_number=None, email=None):
+    """
+    Return ``{field: message}`` for every identifier already in use, using a
+    single OR'd query. Username and email compare case-insensitively, the same
+    way login looks them up.
+    """
+    condition = _identity_condition(username, phone_number, email)
+    if not condition:
+        return {}
+    rows = members.objects.filter(condition).values('username', 'phone_number', 'email')
+    return _identity_conflicts(rows, username, phone_number, email)
+
+
+async def afind_identity_conflicts(username=None, phone_number=None, email=None):
+    condition = _identity_condition(username, phone_number, email)
+    if not condition:
+        return {}
+    rows = [row async for row in members.objects.filter(condition).values('username', 'phone_number', 'email')]
+    return _identity_conflicts(rows, username, phone_number, email)
+
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -16,37 +79,63 @@ class UserSerializer(serializers.ModelSerializer):
             'username', 'password', 'email', 'phone_number',
             'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser'
         ]
+        # Uniqueness is checked in validate() with one query instead of a
+        # UniqueValidator (and its own query) per field
+        extra_kwargs = {
+            'username': {'validators': [UnicodeUsernameValidator()]},
+            'email': {'validators': []},
+            'phone_number': {'validators': []},
+        }
 
     def validate(self, data):
-        # Check username uniqueness with a clearer error message
-        username = data.get('username')
-        if members.objects.filter(username=username).exists():
-            raise serializers.ValidationError({"username": "This username is already taken. Please choose another one."})
-        
-        # Check phone number uniqueness with a clearer error message
-        phone_number = data.get('phone_number')
-        if phone_number and members.objects.filter(phone_number=phone_number).exists():
-            raise serializers.ValidationError({"phone_number": "This phone number is already registered. Please use another one."})
-        
-        # Check email uniqueness with a clearer error message
-        email = data.get('email')
-        if email and members.objects.filter(email=email).exists():
-            raise serializers.ValidationError({"email": "This email is already registered. Please use another one."})
-            
+        conflicts = find_identity_conflicts(
+            username=data.get('username'),
+            phone_number=data.get('phone_number'),
+            email=data.get('email'),
+        )
+        if conflicts:
+            raise serializers.ValidationError(conflicts)
         return data
 
     def create(self, validated_data):
-        user = members.objects.create_user(
-            username=validated_data["username"],
-            first_name=validated_data.get("first_name", ""),
-            last_name=validated_data.get("last_name", ""),
-            email=validated_data.get("email"),
-            phone_number=validated_data.get("phone_number", ""),
-            password=validated_data['password'],  # Pass password directly here
-        )
+        try:
+            with transaction.atomic():
+                user = members.objects.create_user(
+                    username=validated_data["username"],
+                    first_name=validated_data.get("first_name", ""),
+                    last_name=validated_data.get("last_name", ""),
+                    email=validated_data.get("email"),
+                    phone_number=validated_data.get("phone_number", ""),
+                    password=validated_data['password'],  # Pass password directly here
+                )
+        except IntegrityError:
+            # Lost a race with a concurrent registration: report it like validate() would
+            conflicts = find_identity_conflicts(
+                username=validated_data.get('username'),
+                phone_number=validated_data.get('phone_number'),
+                email=validated_data.get('email'),
+            )
+            if not conflicts:
+                raise
+            raise serializers.ValidationError(conflicts)
         return user
 
 
+class AsyncUserSerializer(UserSerializer):
+    """
+    Field validation only; the async register view checks uniqueness with
+    ``afind_identity_conflicts`` and creates the user itself.
+    """
+
+    def validate(self, data):
+        return data
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    # Checks the blacklist through the local Bloom filter first
+    token_class = RefreshToken
+
+
 class TokenObtainPairSerializer(serializers.Serializer):
     login_id = serializers.CharField(required=True, help_text="Enter your username or email")
     password = serializers.CharField(required=True, write_only=True)
@@ -59,48 +148,30 @@ class TokenObtainPairSerializer(serializers.Serializer):
         if not login_id:
             raise serializers.ValidationError({'login_id': ['Please provide username or email']})
 
-        # Debug info
-        print(f"Login attempt with: login_id={login_id}")
-        print(f"All users in database: {list(members.objects.values_list('username', 'email'))}")
+        event(auth_logger, "login.attempt", login_id=login_id)
 
-        # Try to find the user
+        # Try to find the user (served by the UPPER(email)/UPPER(username) indexes)
         user = None
+        lookup = 'email__iexact' if '@' in login_id else 'username__iexact'
+        try:
+            user = members.objects.get(**{lookup: login_id})
+        except members.DoesNotExist:
+            event(auth_logger, "login.user_not_found", lookup=lookup)
 
-        # Check if login_id is an email (contains @)
-        if '@' in login_id:
-            try:
-                user = members.objects.get(email__iexact=login_id)
-                print(f"User found by email: {user.email}")
-            except members.DoesNotExist:
-                print(f"No user found with email: {login_id}")
-        else:
-            # Treat as username
-            try:
-                user = members.objects.get(username__iexact=login_id)
-                print(f"User found by username: {user.username}")
-            except members.DoesNotExist:
-                print(f"No user found with username: {login_id}")
-        
         if not user:
-            print("User lookup failed completely")
             raise serializers.ValidationError({'non_field_errors': ['User not found with provided credentials']})
 
-        # Print debug info about the found user
-        print(f"Found user: id={user.id}, username={user.username}, email={user.email}")
-        
         # Check the password using Django's built-in check_password method
         if not user.check_password(password):
-            print(f"Password mismatch for user {user.username}!")
-            print(f"Password sent: {password}")
+            event(auth_logger, "login.invalid_password", logging.INFO, user_id=user.id)
             raise serializers.ValidationError({'non_field_errors': ['Invalid password']})
 
         # Ensure the user is active
         if not user.is_active:
-            print("User is inactive!")
+            event(auth_logger, "login.inactive", logging.INFO, user_id=user.id)
             raise serializers.ValidationError({'non_field_errors': ['User account is inactive']})
 
-        # Debugging: If the user is successfully authenticated
-        print(f"User authenticated successfully: {user.username}")
+        event(auth_logger, "login.success", user_id=user.id)
 
         # Generate JWT tokens
         refresh = RefreshToken.for_user(user)
@@ -130,11 +201,11 @@ class EmailVerificationRequestSerializer(serializers.Serializer):
             user=user,
             email=validated_data['email']
         )
-        send_mail(
+        # Delivered by the outbox worker so the request doesn't wait on SMTP
+        enqueue_email(
+            email_verification.email,
             'Email Verification',
             f'Your verification code is: {email_verification.token}',
-            'no-reply@example.com',
-            [email_verification.email],
         )
         return email_verification
 
@@ -154,7 +225,7 @@ class EmailVerificationSerializer(serializers.Serializer):
     def save(self, **kwargs):
         verification = self.validated_data['token']
         verification.is_verified = True
-        verification.save()
+        verification.save(update_fields=['is_verified'])
         return verification
 
 
@@ -177,27 +248,35 @@ class SMSVerificationRequestSerializer(serializers.Serializer):
             phone_number=validated_data['phone_number'],
             code=code
         )
-        # Simulate SMS send (replace with actual SMS API integration)
-        print(f"Sending SMS to {sms_verification.phone_number}: Your code is {code}")
+        enqueue_sms(sms_verification.phone_number, f"Your verification code is {code}")
         return sms_verification
 
 
 class SMSVerificationSerializer(serializers.Serializer):
+    phone_number = serializers.CharField(max_length=11)
     code = serializers.CharField(max_length=6)
 
-    def validate_code(self, value):
-        try:
-            verification = SMSVerification.objects.get(code=value, is_verified=False)
-            if verification.is_expired():
-                raise serializers.ValidationError("Code has expired.")
-            return verification
-        except SMSVerification.DoesNotExist:
-            raise serializers.ValidationError("Invalid code.")
+    def validate(self, data):
+        # Keyed by (user, phone_number, code): one small index lookup, and a
+        # code issued to somebody else can never match
+        user = self.context['request'].user
+        verification = SMSVerification.objects.filter(
+            user=user,
+            phone_number=data['phone_number'],
+            code=data['code'],
+            is_verified=False,
+        ).order_by('-created_at').first()
+        if verification is None:
+            raise serializers.ValidationError({"code": "Invalid code."})
+        if verification.is_expired():
+            raise serializers.ValidationError({"code": "Code has expired."})
+        data['verification'] = verification
+        return data
 
     def save(self, **kwargs):
-        verification = self.validated_data['code']
+        verification = self.validated_data['verification']
         verification.is_verified = True
-        verification.save()
+        verification.save(update_fields=['is_verified'])
         return verification
 
 
@@ -207,6 +286,7 @@ class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = '__all__'
+        read_only_fields = ['user']
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -218,11 +298,132 @@ class SubCategorySerializer(serializers.ModelSerializer):
         model = SubCategory
         fields = '__all__'
 
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    subcategories = SubCategorySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'description', 'subcategories']
+
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
 
+class ProductImportSerializer(serializers.Serializer):
+    """
+    One row of a supplier feed (see the import_products command). Category and
+    subcategory are given by slug and resolved against the ``categories`` and
+    ``sub_categories`` maps in the context, so validating a row costs no query.
+    """
+    sku = serializers.CharField(max_length=64, required=False, allow_null=True)
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    summary = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    price = serializers.FloatField(required=False, allow_null=True, min_value=0)
+    img = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    category = serializers.SlugField(max_length=255)
+    sub_category = serializers.SlugField(max_length=255)
+    tags = CommaSeparatedField(child=serializers.CharField(max_length=50), required=False, default=list)
+
+    def to_internal_value(self, data):
+        # CSV gives empty strings for missing optional values
+        data = {key: value for key, value in data.items() if value != ''}
+        return super().to_internal_value(data)
+
+    def validate(self, data):
+        categories = self.context['categories']
+        sub_categories = self.context['sub_categories']
+        category_id = categories.get(data['category'])
+        if category_id is None:
+            raise serializers.ValidationError({'category': f"Unknown category '{data['category']}'."})
+        sub_category = sub_categories.get((category_id, data['sub_category']))
+        if sub_category is None:
+            raise serializers.ValidationError(
+                {'sub_category': f"Unknown subcategory '{data['sub_category']}' in '{data['category']}'."}
+            )
+        data['category'] = category_id
+        data['sub_category'] = sub_category
+        if self.context.get('require_sku') and not data.get('sku'):
+            raise serializers.ValidationError({'sku': "Required when upserting."})
+        return data
+
+
+def parse_id(value):
+    """
+    The primary key in ``value`` (an int or a string of ASCII digits), or
+    None. Bools, floats and other strings are not ids.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves primary keys from ``context['related'][model]``, a dict of
+    instances loaded once for a whole batch, instead of one query per value.
+    """
+
+    def to_internal_value(self, data):
+        related = self.context.get('related', {}).get(self.get_queryset().model)
+        if related is None:
+            return super().to_internal_value(data)
+        pk = parse_id(data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = related.get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class BulkModelSerializer(serializers.ModelSerializer):
+    """
+    Base for the bulk catalog endpoints: validates one item without touching
+    the database. Related objects come from the batch's prefetched map and
+    uniqueness is left to the database constraint, checked once on write.
+    """
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field in fields.values():
+            field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+        return fields
+
+    def get_validators(self):
+        return []
+
+
+class ProductBulkSerializer(BulkModelSerializer):
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+
+class CategoryBulkSerializer(BulkModelSerializer):
+    class Meta:
+        model = Category
+        fields = '__all__'
+
+
+class SubCategoryBulkSerializer(BulkModelSerializer):
+    class Meta:
+        model = SubCategory
+        fields = '__all__'
+
+
+class DiscountBulkSerializer(BulkModelSerializer):
+    class Meta:
+        model = Discount
+        fields = '__all__'
+
+
 class ProductImagesDescriptionsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product_Images_Descriptions
@@ -237,22 +438,29 @@ class WishlistSerializer(serializers.ModelSerializer):
     class Meta:
         model = Wishlist
         fields = '__all__'
+        read_only_fields = ['user']
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
+        read_only_fields = ['user']
 
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        read_only_fields = ['user']
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = '__all__'
 
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
 class ShippingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Shipping
@@ -272,3 +480,63 @@ class ProductViewSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductView
         fields = '__all__'
+
+
+
+#CheckoutSerializer:
+
+class CheckoutItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    price = serializers.FloatField(
+        required=False,
+        help_text="Unit price the client showed; the checkout is rejected if it no longer matches"
+    )
+
+
+class CheckoutShippingSerializer(serializers.Serializer):
+    address = serializers.CharField()
+    cost = serializers.FloatField(min_value=0, default=0.0)
+
+
+class CheckoutPaymentSerializer(serializers.Serializer):
+    payment_type = serializers.CharField(max_length=20)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, allow_empty=False)
+    shipping = CheckoutShippingSerializer()
+    payment = CheckoutPaymentSerializer()
+
+    def validate_items(self, items):
+        user = self.context['request'].user
+        product_ids = {item['product'] for item in items}
+
+        # Cached per product and day; at most two queries whatever the cart size
+        prices = effective_prices(product_ids, user=user)
+
+        errors = []
+        for item in items:
+            product_id = item['product']
+            if product_id not in prices or prices[product_id].price is None:
+                errors.append({"product": [f"Product {product_id} is not available."]})
+                continue
+            unit_price = prices[product_id].effective_price
+            if 'price' in item and abs(item['price'] - unit_price) > 0.005:
+                errors.append({"price": [f"Price changed to {unit_price}."]})
+                continue
+            item['price'] = unit_price
+            errors.append({})
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        with transaction.atomic():
+            order = Order.objects.create(user=user)
+            order.add_items(validated_data['items'])
+            Shipping.objects.create(order=order, **validated_data['shipping'])
+            Payment.objects.create(user=user, Payment_type=validated_data['payment']['payment_type'])
+        return order
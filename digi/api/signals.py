@@ -0,0 +1,281 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import user_cache
+from .cache import catalog_cache
+from .facets import FACET_COLUMNS, FACET_FIELDS, apply_deltas, count_products, product_facets, rebuild_facet_counts
+from .listing import refresh_listings
+from .models import Category, Discount, Product, ProductListing, Review, SubCategory, members
+from .pricing import forget_prices, price_cache
+from .ratings import apply_rating_deltas, rating_delta
+from .tokens import blacklist_index
+
+# Sent after bulk_create/bulk_update/queryset deletes, which bypass the model
+# signals, with ``ids`` of the affected rows (``action`` is "created",
+# "updated", "deleted" or "imported"; ``ids`` is None when unknown). Updates
+# also pass the written ``fields``, and writers that overwrite rows pass
+# ``previous``, the old column values as ``{id: {column: value}}``.
+bulk_changed = Signal()
+
+
+# Cache invalidations wait for the commit: bumping the version earlier lets a
+# concurrent reader cache the pre-commit rows under the new version, and a
+# rollback would bump it for nothing.
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+def invalidate_category_tree(sender, **kwargs):
+    transaction.on_commit(catalog_cache.invalidate)
+
+
+@receiver(bulk_changed, sender=Category)
+@receiver(bulk_changed, sender=SubCategory)
+def invalidate_category_tree_in_bulk(sender, **kwargs):
+    transaction.on_commit(catalog_cache.invalidate)
+
+
+@receiver([post_save, post_delete], sender=members)
+def drop_cached_user(sender, instance, **kwargs):
+    user_cache.delete(str(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def announce_blacklisted_token(sender, **kwargs):
+    blacklist_index.changed()
+
+
+# Product columns read by the facet, listing and price handlers below
+LISTING_COLUMNS = ['name', 'description', 'summary', 'img', 'price', *FACET_COLUMNS]
+
+
+@receiver(pre_save, sender=Product)
+def remember_product(sender, instance, **kwargs):
+    previous = None
+    if instance.pk and not instance._state.adding:
+        previous = Product.objects.filter(pk=instance.pk).values(*LISTING_COLUMNS).first()
+    instance._previous = previous
+
+
+def _product_changed(instance, columns):
+    # New rows, and rows saved without the pre_save snapshot, count as changed
+    previous = getattr(instance, '_previous', None)
+    return previous is None or any(previous[column] != getattr(instance, column) for column in columns)
+
+
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, **kwargs):
+    if not _product_changed(instance, FACET_COLUMNS):
+        return
+    deltas = product_facets(instance.tags, instance.category_id, instance.sub_category_id)
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        deltas.subtract(product_facets(*(previous[column] for column in FACET_COLUMNS)))
+    apply_deltas(deltas)
+
+
+@receiver(pre_delete, sender=Product)
+def remove_product_facets(sender, instance, **kwargs):
+    deltas = product_facets(instance.tags, instance.category_id, instance.sub_category_id)
+    apply_deltas({key: -count for key, count in deltas.items()})
+
+
+@receiver(bulk_changed, sender=Product)
+def count_product_facets_in_bulk(sender, action, ids, fields=None, previous=None, **kwargs):
+    # Queryset deletes still send pre_delete for each row
+    if action == "deleted":
+        return
+    if action == "updated" and not FACET_FIELDS.intersection(fields or ()):
+        return
+    # Without the rows, or the old values of updated rows, only a recount is right
+    if ids is None or (action == "updated" and previous is None):
+        rebuild_facet_counts()
+        return
+    count_products(ids, previous)
+
+
+def _deletes_products(origin):
+    # Discounts and reviews removed by a cascade from their product must not
+    # recreate the listing row the same cascade is deleting
+    model = origin if isinstance(origin, type) else getattr(origin, 'model', type(origin))
+    return model in (Product, Category, SubCategory)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_listing(sender, instance, **kwargs):
+    if _product_changed(instance, LISTING_COLUMNS):
+        refresh_listings(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(bulk_changed, sender=Product)
+def refresh_product_listings_in_bulk(sender, action, ids, **kwargs):
+    # Deleted rows take their listing rows with them through the FK cascade
+    if action == "deleted":
+        return
+    refresh_listings(None if ids is None else Product.objects.filter(pk__in=ids))
+
+
+# Listing column prefix for the category names and slugs copied into it
+LISTING_PREFIX = {Category: 'category', SubCategory: 'sub_category'}
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=SubCategory)
+def remember_category_name(sender, instance, **kwargs):
+    previous = None
+    if instance.pk and not instance._state.adding:
+        previous = sender.objects.filter(pk=instance.pk).values_list('name', 'slug').first()
+    instance._previous_name = previous
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+def rename_category_listings(sender, instance, created, **kwargs):
+    # Only the copied name and slug change, so one UPDATE rewrites them in
+    # place; the old slug lets it use the listing's slug index
+    previous = getattr(instance, '_previous_name', None)
+    if created or previous is None or previous == (instance.name, instance.slug):
+        return
+    prefix = LISTING_PREFIX[sender]
+    ProductListing.objects.filter(**{f'{prefix}_slug': previous[1], f'{prefix}_id': instance.pk}).update(
+        **{f'{prefix}_name': instance.name, f'{prefix}_slug': instance.slug},
+    )
+
+
+@receiver(bulk_changed, sender=Category)
+@receiver(bulk_changed, sender=SubCategory)
+def rename_category_listings_in_bulk(sender, action, ids, fields=None, **kwargs):
+    if action != "updated" or not {'name', 'slug'}.intersection(fields or ()):
+        return
+    prefix = LISTING_PREFIX[sender]
+    current = sender.objects.filter(pk=OuterRef(f'{prefix}_id'))
+    ProductListing.objects.filter(**{f'{prefix}_id__in': ids}).update(**{
+        f'{prefix}_name': Subquery(current.values('name')),
+        f'{prefix}_slug': Subquery(current.values('slug')),
+    })
+
+
+@receiver(post_save, sender=Discount)
+def refresh_listing_of_related_product(sender, instance, **kwargs):
+    refresh_listings(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_delete, sender=Discount)
+def refresh_listing_after_related_delete(sender, instance, origin=None, **kwargs):
+    if not _deletes_products(origin):
+        refresh_listings(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(bulk_changed, sender=Discount)
+def refresh_discounted_listings_in_bulk(sender, action, ids, fields=None, **kwargs):
+    # Deletes go through post_delete; a discount moved to another product
+    # leaves its old product stale, so recompute everything then
+    if action == "deleted":
+        return
+    if ids is None or 'product' in (fields or ()):
+        refresh_listings()
+    else:
+        refresh_listings(Product.objects.filter(pk__in=Discount.objects.filter(pk__in=ids).values('product_id')))
+
+
+# Discount columns that decide which prices a discount changes, and how
+DISCOUNT_COLUMNS = ['product_id', 'user_id', 'discount_percentage', 'start_date', 'end_date', 'active']
+
+
+def _forget_discounted_prices(discounts):
+    # Public discounts change their product's price, personal ones the user's discounts
+    forget_prices(
+        product_ids={product_id for product_id, user_id in discounts if user_id is None},
+        user_ids={user_id for product_id, user_id in discounts if user_id is not None},
+    )
+
+
+@receiver(pre_save, sender=Discount)
+def remember_discount(sender, instance, **kwargs):
+    previous = None
+    if instance.pk and not instance._state.adding:
+        previous = Discount.objects.filter(pk=instance.pk).values(*DISCOUNT_COLUMNS).first()
+    instance._previous = previous
+
+
+@receiver(post_save, sender=Discount)
+def forget_discount_prices(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous and all(previous[column] == getattr(instance, column) for column in DISCOUNT_COLUMNS):
+        return
+    discounts = {(instance.product_id, instance.user_id)}
+    if previous:
+        discounts.add((previous['product_id'], previous['user_id']))
+    _forget_discounted_prices(discounts)
+
+
+@receiver(post_delete, sender=Discount)
+def forget_deleted_discount_prices(sender, instance, **kwargs):
+    _forget_discounted_prices({(instance.product_id, instance.user_id)})
+
+
+@receiver(post_save, sender=Product)
+def forget_product_prices(sender, instance, created, **kwargs):
+    # New products were never cached
+    if not created and _product_changed(instance, ['price']):
+        forget_prices(product_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def forget_deleted_product_prices(sender, instance, **kwargs):
+    forget_prices(product_ids=[instance.pk])
+
+
+@receiver(bulk_changed, sender=Discount)
+def forget_discount_prices_in_bulk(sender, action, ids, fields=None, **kwargs):
+    # Deletes go through post_delete
+    if action == "deleted":
+        return
+    if ids is None or {'product', 'user'}.intersection(fields or ()):
+        # The rows' previous targets are unknown
+        transaction.on_commit(price_cache.invalidate)
+        return
+    _forget_discounted_prices(set(Discount.objects.filter(pk__in=ids).values_list('product_id', 'user_id')))
+
+
+@receiver(bulk_changed, sender=Product)
+def forget_product_prices_in_bulk(sender, action, ids, fields=None, **kwargs):
+    # New products were never cached; deletes go through post_delete
+    if action in ("created", "deleted") or (action == "updated" and 'price' not in (fields or ())):
+        return
+    if ids is None:
+        transaction.on_commit(price_cache.invalidate)
+    else:
+        forget_prices(product_ids=ids)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    previous = None
+    if instance.pk and not instance._state.adding:
+        previous = Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+    instance._previous_rating = previous
+
+
+@receiver(post_save, sender=Review)
+def count_review_rating(sender, instance, **kwargs):
+    deltas = rating_delta(instance.product_id, instance.rating)
+    previous = getattr(instance, '_previous_rating', None)
+    if previous:
+        for product_id, delta in rating_delta(*previous, sign=-1).items():
+            deltas.setdefault(product_id, Counter()).update(delta)
+    changed = apply_rating_deltas(deltas)
+    if changed:
+        refresh_listings(Product.objects.filter(pk__in=changed))
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review_rating(sender, instance, origin=None, **kwargs):
+    if _deletes_products(origin):
+        return
+    apply_rating_deltas(rating_delta(instance.product_id, instance.rating, sign=-1))
+    refresh_listings(Product.objects.filter(pk=instance.product_id))
@@ -1,5 +1,63 @@
-from django.test import TestCase
-from .models import members
+import itertools
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.contrib.auth.hashers import make_password
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from .health import SystemSampler, system_sampler
+from .outbox import drain, enqueue_email
+from .serializers import UserSerializer
+from .views import ReviewView
+from .authentication import CachedJWTAuthentication, ClaimsJWTAuthentication, user_cache
+from .tokens import RefreshToken, blacklist_index
+from .throttling import ScopedSlidingThrottle, previous_windows
+from .cache import catalog_cache
+from .signals import bulk_changed
+from .pricing import effective_prices, price_cache
+from .models import (
+    members, Category, SubCategory, Product, Order, OrderItem, Discount, Payment, Wishlist, OutboxMessage,
+    SMSVerification, EmailVerification, FacetCount, ProductListing, Review, ProductRating,
+)
+
+PHONE_NUMBERS = (f"0913{n:07d}" for n in itertools.count(1))
+
+
+class Fixtures:
+    """
+    Users and a Phones/Android catalog shared by the API tests.
+    """
+
+    def make_user(self, username, password="secret", phone_number=None, **extra):
+        return members.objects.create_user(
+            username=username, password=password, email=f"{username}@example.com",
+            phone_number=phone_number or next(PHONE_NUMBERS), **extra
+        )
+
+    def sign_in(self, user):
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        return user
+
+    def make_catalog(self):
+        self.category = Category.objects.create(name="Phones", slug="phones")
+        self.sub_category = SubCategory.objects.create(Category=self.category, name="Android", slug="android")
+
+    def make_product(self, name, **fields):
+        return Product.objects.create(name=name, category=self.category, sub_category=self.sub_category, **fields)
+
 
 class MembersModelTest(TestCase):
     def test_create_user(self):
@@ -19,3 +77,988 @@ class MembersModelTest(TestCase):
         )
         self.assertTrue(superuser.is_superuser)
         self.assertTrue(superuser.is_staff)
+
+
+class ProductListTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.sign_in(self.make_user("shopper"))
+
+        phones = Category.objects.create(name="Phones", slug="phones")
+        books = Category.objects.create(name="Books", slug="books")
+        android = SubCategory.objects.create(Category=phones, name="Android", slug="android")
+        novels = SubCategory.objects.create(Category=books, name="Novels", slug="novels")
+        for i in range(5):
+            Product.objects.create(name=f"Phone {i}", price=100 + i, category=phones, sub_category=android, tags=["sale"] if i % 2 else [])
+        for i in range(3):
+            Product.objects.create(name=f"Book {i}", price=10 + i, category=books, sub_category=novels)
+
+    def test_pages_are_bounded_and_single_query(self):
+        self.client.get('/api/products/', {'page_size': 3})  # Loads this user's discounts into the price cache
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/', {'page_size': 3})
+        body = response.json()
+        self.assertEqual([p['name'] for p in body['results']], ["Phone 0", "Phone 1", "Phone 2"])
+        self.assertEqual(body['results'][0]['category'], "Phones")
+
+        response = self.client.get(body['next'])
+        self.assertEqual([p['name'] for p in response.json()['results']], ["Phone 3", "Phone 4", "Book 0"])
+
+    def test_filters(self):
+        response = self.client.get('/api/products/', {'category': 'phones', 'tag': 'sale'})
+        self.assertEqual([p['name'] for p in response.json()['results']], ["Phone 1", "Phone 3"])
+
+        response = self.client.get('/api/products/', {'sub_category': 'novels', 'max_price': 11})
+        self.assertEqual([p['name'] for p in response.json()['results']], ["Book 0", "Book 1"])
+
+        response = self.client.get('/api/products/', {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductExportTest(Fixtures, TestCase):
+    def setUp(self):
+        self.sign_in(self.make_user("indexer"))
+        self.make_catalog()
+        for i in range(3):
+            self.make_product(f"Phone {i}", price=100 + i)
+
+    def test_ndjson_export(self):
+        response = self.client.get('/api/products/export/', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['name'] for row in rows], ["Phone 0", "Phone 1", "Phone 2"])
+        self.assertEqual(rows[0]['category_name'], "Phones")
+
+    def test_json_export(self):
+        response = self.client.get('/api/products/export/', {'format': 'json', 'min_price': 101})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['name'] for row in rows], ["Phone 1", "Phone 2"])
+
+
+class CategoryCacheTest(Fixtures, TestCase):
+    def setUp(self):
+        self.sign_in(self.make_user("browser"))
+        self.make_catalog()
+
+    def test_tree_is_served_from_cache_with_etag(self):
+        response = self.client.get('/api/categories/tree/')
+        self.assertEqual(response.json()[0]['subcategories'][0]['slug'], "android")
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_saving_a_category_invalidates_the_tree(self):
+        etag = self.client.get('/api/categories/tree/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Books", slug="books")
+
+        response = self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['slug'] for c in response.json()], ["phones", "books"])
+
+    def test_rolled_back_writes_keep_the_tree(self):
+        version = catalog_cache.version()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Category.objects.create(name="Books", slug="books")
+            raise RuntimeError
+        self.assertEqual(catalog_cache.version(), version)
+
+
+class OrderItemsTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.make_user("buyer")
+        self.make_catalog()
+        self.products = [self.make_product(f"Phone {i}", price=10.0 * (i + 1)) for i in range(50)]
+        self.order = Order.objects.create(user=self.user)
+        price_cache.invalidate()
+
+    def test_add_items_is_set_based(self):
+        # prices, personal discounts, savepoint, bulk insert, SUM, order update, release
+        with self.assertNumQueries(7):
+            self.order.add_items({'product': product, 'quantity': 2} for product in self.products)
+
+        self.order.refresh_from_db()
+        self.assertEqual(OrderItem.objects.filter(order=self.order).count(), 50)
+        self.assertEqual(self.order.total_amount, sum(2 * p.price for p in self.products))
+
+    def test_add_items_endpoint(self):
+        self.sign_in(self.user)
+        response = self.client.post(
+            f'/api/orders/{self.order.id}/items/',
+            [{'product': self.products[0].id, 'quantity': 3}, {'product': self.products[1].id}],
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_amount'], 3 * 10.0 + 20.0)
+
+        response = self.client.post(f'/api/orders/{self.order.id}/items/', [{'product': 999999}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_lines_are_priced_like_checkout(self):
+        Discount.objects.create(product=self.products[0], discount_percentage=50)
+        self.sign_in(self.user)
+        response = self.client.post(
+            f'/api/orders/{self.order.id}/items/', [{'product': self.products[0].id, 'price': 0.01}], format='json',
+        )
+        self.assertEqual(response.json()['total_amount'], 5.0)
+
+    def test_priced_lines_are_checked_too(self):
+        with self.assertRaises(Product.DoesNotExist):
+            self.order.add_items([{'product': 999999, 'price': 1.0}])
+
+    def test_only_pending_orders_take_items(self):
+        self.order.status = "shipped"
+        self.order.save()
+        self.sign_in(self.user)
+        response = self.client.post(f'/api/orders/{self.order.id}/items/', [{'product': self.products[0].id}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.order.items.exists())
+
+
+class CheckoutTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.sign_in(self.make_user("checkout"))
+        self.make_catalog()
+        self.phone = self.make_product("Phone", price=200.0)
+        self.case = self.make_product("Case", price=20.0)
+        Discount.objects.create(product=self.phone, discount_percentage=10)
+        Discount.objects.create(product=self.phone, discount_percentage=25, active=False)
+
+    def checkout(self, items):
+        return self.client.post('/api/checkout/', {
+            'items': items,
+            'shipping': {'address': "1 Main St", 'cost': 5},
+            'payment': {'payment_type': "card"},
+        }, format='json')
+
+    def test_checkout_creates_everything_at_once(self):
+        response = self.checkout([{'product': self.phone.id, 'quantity': 2}, {'product': self.case.id, 'price': 20.0}])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['total_amount'], 2 * 180.0 + 20.0)
+        self.assertEqual(len(body['items']), 2)
+        self.assertEqual(body['shipping']['address'], "1 Main St")
+        self.assertEqual(Payment.objects.filter(user=self.user).count(), 1)
+
+    def test_stale_price_writes_nothing(self):
+        response = self.checkout([{'product': self.phone.id, 'price': 200.0}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['items'][0]['price'], ["Price changed to 180.0."])
+        self.assertFalse(Order.objects.exists())
+
+
+class ListQueryTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.sign_in(self.make_user("lister"))
+        for amount, order_status in [(30, "pending"), (10, "shipped"), (20, "pending"), (40, "cancelled")]:
+            Order.objects.create(user=self.user, total_amount=amount, status=order_status)
+
+    def test_limit_offset_and_ordering(self):
+        response = self.client.get('/api/orders/', {'limit': 2, 'offset': 1, 'ordering': 'total_amount'})
+        body = response.json()
+        self.assertEqual(body['count'], 4)
+        self.assertEqual([o['total_amount'] for o in body['results']], [20, 30])
+
+        # Fields outside ordering_fields are ignored
+        response = self.client.get('/api/orders/', {'ordering': 'user__password'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_pages(self):
+        body = self.client.get('/api/orders/', {'cursor': '', 'limit': 3, 'ordering': '-total_amount'}).json()
+        self.assertNotIn('count', body)
+        self.assertEqual([o['total_amount'] for o in body['results']], [40, 30, 20])
+        body = self.client.get(body['next']).json()
+        self.assertEqual([o['total_amount'] for o in body['results']], [10])
+
+    def test_typed_filters(self):
+        body = self.client.get('/api/orders/', {'status': 'pending'}).json()
+        self.assertEqual(sorted(o['total_amount'] for o in body['results']), [20, 30])
+
+        response = self.client.get('/api/orders/', {'status': 'lost'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.json())
+
+
+class PerUserScopingTest(Fixtures, TestCase):
+    def setUp(self):
+        self.alice = self.sign_in(self.make_user("alice"))
+        self.bob = self.make_user("bob")
+        self.make_catalog()
+        self.product = self.make_product("Phone", price=10)
+        self.bobs_order = Order.objects.create(user=self.bob)
+        Wishlist.objects.create(user=self.bob, product=self.product)
+
+    def test_lists_only_show_own_rows(self):
+        self.client.post('/api/wishlists/', {'product': self.product.id, 'user': self.bob.id}, format='json')
+        Wishlist.objects.create(user=self.alice, product=self.product, deleted_at=now())
+
+        body = self.client.get('/api/wishlists/').json()
+        self.assertEqual(body['count'], 1)
+        self.assertEqual(body['results'][0]['user'], self.alice.id)
+        self.assertEqual(self.client.get('/api/orders/').json()['count'], 0)
+
+    def test_other_users_rows_are_not_found(self):
+        response = self.client.get(f'/api/orders/{self.bobs_order.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class HealthCheckTest(TestCase):
+    def test_probe_serves_the_last_snapshot(self):
+        with mock.patch.object(system_sampler, 'start'):
+            system_sampler.sample()
+            with mock.patch('api.health.psutil.cpu_percent') as cpu_percent, self.assertNumQueries(0):
+                response = self.client.get('/api/health/detailed/')
+            cpu_percent.assert_not_called()
+
+        body = response.json()
+        self.assertEqual(body['database']['status'], "healthy")
+        self.assertIn('sampled_at', body)
+        self.assertGreaterEqual(body['age_seconds'], 0)
+        self.assertNotIn('_monotonic', body)
+
+    def test_first_probe_does_not_sample_on_the_request_thread(self):
+        sampler = SystemSampler(interval=10)
+        with mock.patch('api.views.system_sampler', sampler), mock.patch.object(sampler, 'start'), \
+                mock.patch.object(sampler, 'sample') as sample:
+            response = self.client.get('/api/health/detailed/')
+        sample.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], "warming up")
+
+    def test_failed_sample_does_not_stop_the_sampler(self):
+        sampler = SystemSampler(interval=0)
+        calls = mock.Mock(side_effect=[RuntimeError("disk gone"), None, KeyboardInterrupt])
+        with mock.patch.object(sampler, 'sample', calls), self.assertLogs('api.health', 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                sampler._run()
+        self.assertEqual(calls.call_count, 3)
+
+
+class OutboxTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.sign_in(self.make_user("verifier", phone_number="09120000009"))
+
+    def test_verification_email_is_queued_then_delivered(self):
+        response = self.client.post('/api/verify-email/', {'email': "verifier@example.com"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.get().status, "pending")
+
+        self.assertEqual(drain(), (1, 0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["verifier@example.com"])
+        self.assertEqual(OutboxMessage.objects.values_list('status', 'body').get(), ("sent", ""))
+
+    def test_sms_without_a_gateway_does_not_log_the_code(self):
+        self.client.post('/api/verify-sms/', {'phone_number': "09120000009"}, format='json')
+        code = SMSVerification.objects.get().code
+        with override_settings(SMS_GATEWAY_URL=None), self.assertLogs('api.outbox', 'INFO') as logs:
+            self.assertEqual(drain(), (1, 0, 0))
+        self.assertNotIn(code, "\n".join(logs.output))
+
+    def test_lost_lease_stops_at_the_attempt_limit(self):
+        message = enqueue_email("verifier@example.com", "Code", "123456")
+        OutboxMessage.objects.filter(pk=message.pk).update(attempts=settings.OUTBOX_MAX_ATTEMPTS)
+        with self.assertLogs('api.outbox', 'WARNING'):
+            self.assertEqual(drain(), (0, 0, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.last_error), ("failed", "lease expired"))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.client.post('/api/verify-sms/', {'phone_number': "09120000009"}, format='json')
+
+        gateway = mock.Mock(side_effect=OSError("gateway down"))
+        with mock.patch.dict('api.outbox.SENDERS', {'sms': gateway}), self.assertLogs('api.outbox', 'WARNING'):
+            self.assertEqual(drain(), (0, 1, 0))
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.status, "pending")
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, "gateway down")
+        self.assertGreater(message.next_attempt_at, now())
+        # Not due yet, so the next run leaves it alone
+        self.assertEqual(drain(), (0, 0, 0))
+
+
+class VerificationLookupTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.sign_in(self.make_user("otp", phone_number="09120000010"))
+        self.other = self.make_user("other", phone_number="09120000011")
+
+    def test_code_is_matched_per_user_and_phone(self):
+        SMSVerification.objects.create(user=self.other, phone_number="09120000011", code="123456")
+        response = self.client.put('/api/verify-sms/', {'phone_number': "09120000010", 'code': "123456"}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        mine = SMSVerification.objects.create(user=self.user, phone_number="09120000010", code="123456")
+        response = self.client.put('/api/verify-sms/', {'phone_number': "09120000010", 'code': "123456"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        mine.refresh_from_db()
+        self.assertTrue(mine.is_verified)
+
+    def test_purge_removes_only_expired_unused_rows(self):
+        past = now() - timedelta(minutes=1)
+        SMSVerification.objects.create(user=self.user, phone_number="09120000010", code="111111", expires_at=past)
+        SMSVerification.objects.create(user=self.user, phone_number="09120000010", code="222222", expires_at=past, is_verified=True)
+        SMSVerification.objects.create(user=self.user, phone_number="09120000010", code="333333")
+        EmailVerification.objects.create(user=self.user, email="otp@example.com", expires_at=past)
+
+        call_command('purge_verifications', stdout=mock.Mock())
+
+        self.assertEqual(sorted(SMSVerification.objects.values_list('code', flat=True)), ["222222", "333333"])
+        self.assertFalse(EmailVerification.objects.exists())
+
+
+class LoginHotPathTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_user("Login")
+        self.client = APIClient()
+
+    def test_login_looks_up_only_the_caller(self):
+        for login_id in ("login", "LOGIN@example.com"):
+            with CaptureQueriesContext(connection) as queries, mock.patch('sys.stdout') as stdout:
+                response = self.client.post('/api/auth/login/', {'login_id': login_id, 'password': "secret"}, format='json')
+            self.assertEqual(response.status_code, 200)
+            member_selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_members"' in q['sql']]
+            self.assertEqual(len(member_selects), 1)
+            self.assertIn('UPPER(', member_selects[0])
+            stdout.write.assert_not_called()
+
+    def test_failed_login_is_logged_without_the_password(self):
+        with self.assertLogs('api.auth', level='INFO') as logs:
+            response = self.client.post('/api/auth/login/', {'login_id': "login", 'password': "wrong-pass"}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("login.invalid_password", logs.output[0])
+        self.assertNotIn("wrong-pass", "".join(logs.output))
+
+
+class RegistrationUniquenessTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_user("taken", phone_number="09120000030")
+        self.payload = {
+            'username': "TAKEN", 'password': "Str0ng-pass!", 'email': "Taken@example.com",
+            'phone_number': "09120000030", 'first_name': "A", 'last_name': "B",
+        }
+
+    def test_all_conflicts_reported_in_one_query(self):
+        serializer = UserSerializer(data=self.payload)
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertEqual(set(serializer.errors), {'username', 'email', 'phone_number'})
+
+    def test_integrity_error_race_becomes_field_errors(self):
+        # validate() already passed, then a concurrent request took the phone number
+        data = dict(self.payload, username="fresh", email="fresh@example.com")
+        with self.assertRaises(serializers.ValidationError) as ctx:
+            UserSerializer().create(data)
+        self.assertEqual(set(ctx.exception.detail), {'phone_number'})
+        self.assertFalse(members.objects.filter(username="fresh").exists())
+
+
+class PasswordHashUpgradeTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.make_user("legacy", password="unused")
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/api/auth/login/', {'login_id': "legacy", 'password': "secret"}, format='json')
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        members.objects.filter(pk=self.user.pk).update(password=make_password("secret", hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+
+    def test_retuned_cost_is_applied_on_login(self):
+        members.objects.filter(pk=self.user.pk).update(password=make_password("secret"))
+        with override_settings(ARGON2_TIME_COST=3):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIn(',t=3,', self.user.password)
+
+    def test_benchmark_recommends_parameters(self):
+        out = mock.Mock()
+        call_command('benchmark_hasher', '--memory-cost', '1024', '--parallelism', '1',
+                     '--max-time-cost', '2', '--samples', '1', '--target-ms', '10000', stdout=out)
+        self.assertIn("ARGON2_TIME_COST = 2", "".join(str(c.args[0]) for c in out.write.call_args_list))
+
+
+class AsyncAuthTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.make_user("async", password="unused")
+        members.objects.filter(pk=self.user.pk).update(password=make_password("secret", hasher='pbkdf2_sha256'))
+
+    async def test_login_verifies_and_upgrades_hash(self):
+        response = await self.async_client.post(
+            '/api/auth/login/async/', {'login_id': "ASYNC", 'password': "secret"}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        user = await members.objects.aget(pk=self.user.pk)
+        self.assertTrue(user.password.startswith('argon2$'))
+
+        response = await self.async_client.post(
+            '/api/auth/login/async/', {'login_id': "async", 'password': "nope"}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_register_is_throttled_like_the_sync_view(self):
+        await sync_to_async(cache.clear)()
+        with mock.patch.object(ScopedSlidingThrottle, 'THROTTLE_RATES', {'anon': "1/day"}):
+            first = await self.async_client.post('/api/auth/register/async/', {}, content_type='application/json')
+            second = await self.async_client.post('/api/auth/register/async/', {}, content_type='application/json')
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(second.status_code, 429)
+        self.assertIn('Retry-After', second)
+
+    async def test_register_creates_user_or_reports_conflicts(self):
+        payload = {
+            'username': "newcomer", 'password': "Str0ng-pass!", 'email': "newcomer@example.com",
+            'phone_number': "09120000051", 'first_name': "New", 'last_name': "Comer",
+        }
+        response = await self.async_client.post('/api/auth/register/async/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('refresh', response.json())
+        user = await members.objects.aget(username="newcomer")
+        self.assertTrue(user.password.startswith('argon2$'))
+
+        payload['email'] = "ASYNC@example.com"
+        response = await self.async_client.post('/api/auth/register/async/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'username', 'email', 'phone_number'})
+
+
+class AuthCacheTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.make_user("cached")
+        user_cache.clear()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {token}")
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_user_is_served_from_memory_until_saved(self):
+        access = str(RefreshToken.for_user(self.user).access_token)
+        self.authenticate(access)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(access).pk, self.user.pk)
+
+        self.user.first_name = "Renamed"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(access).first_name, "Renamed")
+
+    def test_blacklist_is_checked_through_the_bloom_filter(self):
+        revoked = RefreshToken.for_user(self.user)
+        revoked.blacklist()
+        response = APIClient().post('/api/auth/token/refresh/', {'refresh': str(revoked)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+        live = RefreshToken.for_user(self.user)
+        blacklist_index.sync()
+        with self.assertNumQueries(0):
+            live.check_blacklist()
+
+
+class ClaimsAuthTest(Fixtures, TestCase):
+    def setUp(self):
+        self.user = self.make_user("browser")
+        self.access = str(RefreshToken.for_user(self.user).access_token)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        user_cache.clear()
+
+    def test_catalog_read_skips_the_user_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reviews/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if '"api_members"' in q['sql']])
+
+    def test_catalog_writes_keep_the_default_auth_and_rates(self):
+        view = ReviewView()
+        for method, authenticator, scope in (("GET", ClaimsJWTAuthentication, "catalog"), ("POST", CachedJWTAuthentication, "user")):
+            view.request = getattr(RequestFactory(), method.lower())('/')
+            self.assertIsInstance(view.get_authenticators()[0], authenticator)
+            throttle = ScopedSlidingThrottle()
+            throttle.allow_request(mock.Mock(method=method, user=self.user), view)
+            self.assertEqual(throttle.scope, scope)
+
+    def test_claims_user_loads_the_row_lazily(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        with self.assertNumQueries(0):
+            user, _ = ClaimsJWTAuthentication().authenticate(request)
+            self.assertEqual((user.username, user.email, user.is_staff), ("browser", "browser@example.com", False))
+        self.assertEqual(user.instance.pk, self.user.pk)
+
+
+class SlidingThrottleTest(Fixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        previous_windows.clear()
+        self.user = self.sign_in(self.make_user("throttled", phone_number="09120000080"))
+
+    def test_scope_is_chosen_per_method(self):
+        for _ in range(10):
+            response = self.client.put('/api/verify-sms/', {'phone_number': "09120000080", 'code': "000000"}, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.put('/api/verify-sms/', {'phone_number': "09120000080", 'code': "000000"}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_unscoped_requests_use_one_counter(self):
+        view = mock.Mock(throttle_scope=None)
+        with mock.patch.object(ScopedSlidingThrottle, 'THROTTLE_RATES', {'user': "2/min", 'anon': "1/min"}):
+            throttle = ScopedSlidingThrottle()
+            self.assertEqual([throttle.allow_request(mock.Mock(user=self.user), view) for _ in range(3)], [True, True, False])
+            self.assertEqual(throttle.scope, "user")
+            anonymous = mock.Mock(user=mock.Mock(is_authenticated=False), META={'REMOTE_ADDR': "10.0.0.1"})
+            with mock.patch.object(cache, 'incr', wraps=cache.incr) as incr:
+                self.assertTrue(throttle.allow_request(anonymous, view))
+            self.assertEqual((throttle.scope, incr.call_count), ("anon", 1))
+
+    def test_previous_window_is_weighted(self):
+        view = mock.Mock(throttle_scope='otp_send')  # 3/min
+        request = mock.Mock(user=self.user)
+
+        def allowed(at):
+            throttle = ScopedSlidingThrottle()
+            throttle.timer = lambda: at
+            return throttle.allow_request(request, view)
+
+        self.assertEqual([allowed(600 + t) for t in (10, 20, 30, 40)], [True, True, True, False])
+        # A quarter into the next window three quarters of the old count remain
+        self.assertFalse(allowed(675))
+        # Three quarters through, 4 * 0.25 + 2 is back within the limit
+        self.assertTrue(allowed(705))
+
+
+class ImportProductsTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_catalog()
+
+    def feed(self, suffix, content):
+        f = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        f.write(content)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_csv_rows_are_validated_and_loaded(self):
+        path = self.feed('.csv', (
+            "sku,name,price,category,sub_category,tags\n"
+            "A1,Phone one,100,phones,android,\"5g,dual sim\"\n"
+            "A2,Phone two,,phones,ios,\n"
+        ))
+        err = mock.Mock()
+        call_command('import_products', path, stdout=mock.Mock(), stderr=err)
+        product = Product.objects.get(sku="A1")
+        self.assertEqual((product.price, product.tags), (100.0, ["5g", "dual sim"]))
+        self.assertEqual(product.sub_category, self.sub_category)
+        self.assertFalse(Product.objects.filter(sku="A2").exists())
+        self.assertIn("Line 3", err.write.call_args.args[0])
+
+    def test_copy_upsert_matches_on_sku(self):
+        self.make_product("Old", sku="B1", price=1)
+        path = self.feed('.ndjson', "\n".join(json.dumps(row) for row in [
+            {"sku": "B1", "name": "New", "price": 2, "category": "phones", "sub_category": "android",
+             "tags": ["say \"hi\"", "a,b"]},
+            {"sku": "B2", "name": "Second", "category": "phones", "sub_category": "android"},
+        ]))
+        call_command('import_products', path, '--upsert', '--method', 'copy', stdout=mock.Mock())
+        updated = Product.objects.get(sku="B1")
+        self.assertEqual((updated.name, updated.price, updated.tags), ("New", 2.0, ['say "hi"', "a,b"]))
+        self.assertEqual(Product.objects.filter(sku__in=["B1", "B2"]).count(), 2)
+
+    def test_existing_skus_are_skipped_without_upsert(self):
+        existing = self.make_product("Old", sku="C1", price=1)
+        path = self.feed('.ndjson', "\n".join(json.dumps(row) for row in [
+            {"sku": "C1", "name": "Clash", "category": "phones", "sub_category": "android"},
+            {"sku": "C2", "name": "Fresh", "category": "phones", "sub_category": "android"},
+            {"sku": "C2", "name": "Again", "category": "phones", "sub_category": "android"},
+        ]))
+        for method in ('bulk', 'copy'):
+            out = mock.Mock()
+            with mock.patch('api.signals.refresh_listings') as refresh:
+                call_command('import_products', path, '--method', method, stdout=out)
+            fresh = Product.objects.get(sku="C2")
+            self.assertEqual((fresh.name, Product.objects.get(sku="C1").name), ("Fresh", "Old"))
+            self.assertIn("skipped 2 existing SKUs", out.write.call_args.args[0])
+            self.assertEqual(list(refresh.call_args.args[0].values_list('id', flat=True)), [fresh.id])
+            fresh.delete()
+        self.assertTrue(Product.objects.filter(pk=existing.pk).exists())
+
+    def test_upserts_move_only_their_facet_counts(self):
+        self.make_product("Old", sku="D1", tags=["old"])
+        path = self.feed('.ndjson', "\n".join(json.dumps(row) for row in [
+            {"sku": "D1", "name": "Old", "category": "phones", "sub_category": "android", "tags": ["new"]},
+            {"sku": "D2", "name": "Fresh", "category": "phones", "sub_category": "android", "tags": ["new"]},
+            {"sku": "D2", "name": "Fresh", "category": "phones", "sub_category": "android", "tags": ["newer"]},
+        ]))
+        with mock.patch('api.signals.rebuild_facet_counts') as rebuild:
+            call_command('import_products', path, '--upsert', '--chunk-size', '2', stdout=mock.Mock())
+        rebuild.assert_not_called()
+        counts = set(FacetCount.objects.values_list('facet', 'value', 'count'))
+        call_command('rebuild_facets', stdout=mock.Mock())
+        self.assertEqual(counts, set(FacetCount.objects.values_list('facet', 'value', 'count')))
+        self.assertEqual({v for f, v, c in counts if f == "tag"}, {"new", "newer"})
+
+
+class BulkCatalogTest(Fixtures, TestCase):
+    def setUp(self):
+        self.admin = self.sign_in(self.make_user("merch", is_staff=True))
+        self.make_catalog()
+        self.products = [self.make_product(f"P{i}", price=10) for i in range(20)]
+
+    def test_price_change_is_one_batch(self):
+        changes = [{'id': p.id, 'price': 15, 'sub_category': self.sub_category.id} for p in self.products]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch('/api/products/bulk/', changes, format='json')
+        self.assertEqual(response.status_code, 200)
+        # Plus the facet deltas of the written rows (sub_category is a facet
+        # field) and the listing refresh, neither of which grows with the batch
+        self.assertLessEqual(len(queries), 8)
+        self.assertEqual({r['status'] for r in response.data['results']}, {'updated'})
+        self.assertEqual(set(Product.objects.values_list('price', flat=True)), {15.0})
+
+    def test_one_invalid_item_rejects_the_batch(self):
+        changes = [{'id': self.products[0].id, 'price': 1}, {'id': 999999, 'price': 1}, {'id': self.products[1].id, 'category': 999999}]
+        response = self.client.patch('/api/products/bulk/', changes, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'invalid', 'invalid'])
+        self.assertIn('category', response.data['results'][2]['errors'])
+        self.assertEqual(Product.objects.get(id=self.products[0].id).price, 10)
+
+    def test_ids_must_be_integers(self):
+        first = self.products[0]
+        response = self.client.delete('/api/products/bulk/', [{'id': True}, {'id': float(first.id)}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['invalid', 'invalid'])
+        for value in (True, 1.5, "1.9"):
+            response = self.client.patch('/api/products/bulk/', [{'id': first.id, 'category': value}], format='json')
+            self.assertIn('category', response.data['results'][0]['errors'])
+        self.assertTrue(Product.objects.filter(pk=first.pk).exists())
+
+    def test_conflicts_are_reported_per_item(self):
+        self.products[0].sku = "TAKEN"
+        self.products[0].save()
+        new = {'name': "New", 'category': self.category.id, 'sub_category': self.sub_category.id}
+        response = self.client.post('/api/products/bulk/', [
+            {**new, 'sku': "FREE"}, {**new, 'sku': "TAKEN"}, {**new, 'sku': "TWICE"}, {**new, 'sku': "TWICE"},
+        ], format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'conflict', 'created', 'conflict'])
+        self.assertFalse(Product.objects.filter(sku__in=["FREE", "TWICE"]).exists())
+
+    def test_category_create_and_delete_refresh_the_tree(self):
+        self.client.get('/api/categories/tree/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/categories/bulk/', [{'name': "Laptops", 'slug': "laptops"}], format='json')
+        self.assertEqual(response.status_code, 200)
+        new_id = response.data['results'][0]['id']
+        self.assertIn("laptops", [c['slug'] for c in self.client.get('/api/categories/tree/').json()])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete('/api/categories/bulk/', [{'id': new_id}], format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'deleted')
+        self.assertNotIn("laptops", [c['slug'] for c in self.client.get('/api/categories/tree/').json()])
+
+    def test_requires_staff(self):
+        self.admin.is_staff = False
+        self.admin.save()
+        response = self.client.post('/api/discounts/bulk/', [], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ProductSearchTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        self.sign_in(self.make_user("seeker"))
+
+    def test_name_matches_rank_above_description_matches(self):
+        in_description = self.make_product("Case", description="fits the galaxy phone")
+        in_name = self.make_product("Galaxy S24", description="flagship")
+        self.make_product("Unrelated", description="nothing here")
+        response = self.client.get('/api/products/search/', {'q': "galaxy"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data['results']], [in_name.id, in_description.id])
+
+    def test_ranked_pages_follow_the_cursor(self):
+        ids = {self.make_product(f"Charger {i}", tags=["usb-c"]).id for i in range(5)}
+        seen = []
+        response = self.client.get('/api/products/search/', {'q': "charger", 'page_size': 2})
+        while True:
+            seen += [p['id'] for p in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(ids))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 400)
+
+    def test_typos_fall_back_to_trigram_matching(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest("pg_trgm is not installed")
+        product = self.make_product("Headphones")
+        response = self.client.get('/api/products/search/', {'q': "hedphones"})
+        self.assertEqual([p['id'] for p in response.data['results']], [product.id])
+
+
+class ProductFacetsTest(Fixtures, TestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones", slug="phones")
+        self.android = SubCategory.objects.create(Category=self.phones, name="Android", slug="android")
+        self.laptops = Category.objects.create(name="Laptops", slug="laptops")
+        self.gaming = SubCategory.objects.create(Category=self.laptops, name="Gaming", slug="gaming")
+        self.phone = Product.objects.create(name="Phone", category=self.phones, sub_category=self.android, tags=["5g", "oled"])
+        self.laptop = Product.objects.create(name="Laptop", category=self.laptops, sub_category=self.gaming, tags=["oled"])
+        self.sign_in(self.make_user("facets"))
+
+    def counts(self):
+        return dict(((f, v), c) for f, v, c in FacetCount.objects.values_list('facet', 'value', 'count'))
+
+    def test_counts_follow_saves_and_deletes(self):
+        self.assertEqual(self.counts()[("tag", "oled")], 2)
+        self.phone.tags = ["5g"]
+        self.phone.category = self.laptops
+        self.phone.save()
+        counts = self.counts()
+        self.assertEqual((counts[("tag", "oled")], counts[("category", str(self.laptops.id))]), (1, 2))
+        self.assertNotIn(("category", str(self.phones.id)), counts)
+
+        self.laptop.delete()
+        self.assertNotIn(("tag", "oled"), self.counts())
+
+        Product.objects.filter(pk=self.phone.pk).update(tags=["usb-c"])
+        bulk_changed.send(sender=Product, action="updated", ids=[self.phone.pk], fields=["tags"],
+                          previous={self.phone.pk: {"tags": ["5g"]}})
+        self.assertEqual(self.counts(), {("tag", "usb-c"): 1, ("category", str(self.laptops.id)): 1,
+                                         ("sub_category", str(self.android.id)): 1})
+
+    def test_browse_and_filtered_facets_agree(self):
+        browse = self.client.get('/api/products/facets/').json()
+        self.assertEqual(browse['tags'], [{'tag': "oled", 'count': 2}, {'tag': "5g", 'count': 1}])
+        self.assertEqual([c['slug'] for c in browse['categories']], ["phones", "laptops"])
+
+        filtered = self.client.get('/api/products/facets/', {'tags_any': "5g,missing"}).json()
+        self.assertEqual(filtered['tags'], [{'tag': "5g", 'count': 1}, {'tag': "oled", 'count': 1}])
+        self.assertEqual(filtered['sub_categories'], [{'id': self.android.id, 'slug': "android", 'name': "Android", 'count': 1}])
+
+    def test_tags_filter_all_and_any(self):
+        ids = lambda params: [p['id'] for p in self.client.get('/api/products/', params).data['results']]
+        self.assertEqual(ids({'tags': "oled,5g"}), [self.phone.id])
+        self.assertEqual(ids({'tags_any': "oled,5g"}), [self.phone.id, self.laptop.id])
+        self.assertEqual(ids({'tag': "oled", 'tags': "5g"}), [self.phone.id])
+        self.assertEqual(ids({'tag': "5g", 'tags': "missing"}), [])
+
+    def test_bulk_writes_count_only_their_rows(self):
+        self.sign_in(self.make_user("merch", is_staff=True))
+        with mock.patch('api.signals.rebuild_facet_counts') as rebuild:
+            self.client.post('/api/products/bulk/', [
+                {'name': "Tablet", 'category': self.laptops.id, 'sub_category': self.gaming.id, 'tags': ["oled", "pen"]},
+            ], format='json')
+            self.client.patch('/api/products/bulk/', [
+                {'id': self.phone.id, 'tags': ["pen"], 'category': self.laptops.id},
+                {'id': self.laptop.id, 'price': 5},
+            ], format='json')
+        rebuild.assert_not_called()
+        counts = self.counts()
+        self.assertEqual((counts[("tag", "pen")], counts[("tag", "oled")]), (2, 2))
+        call_command('rebuild_facets', stdout=mock.Mock())
+        self.assertEqual(counts, self.counts())
+
+
+class ProductListingTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        self.product = self.make_product("Phone", price=200)
+        self.user = self.sign_in(self.make_user("lister"))
+
+    def test_listing_follows_discounts_reviews_and_renames(self):
+        Discount.objects.create(product=self.product, discount_percentage=25)
+        Discount.objects.create(product=self.product, user=self.user, discount_percentage=50)  # Personal
+        Review.objects.create(product=self.product, user=self.user, rating=4)
+        Review.objects.create(product=self.product, user=self.user, rating=5)
+        self.category.name = "Mobiles"
+        self.category.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            item = self.client.get(f'/api/products/{self.product.id}/').json()
+        self.assertNotIn("JOIN", queries[-1]['sql'])
+        self.assertEqual(
+            (item['price'], item['effective_price'], item['category'], item['average_rating'], item['review_count']),
+            (200.0, 100.0, "Mobiles", 4.5, 2),
+        )
+        self.assertEqual(ProductListing.objects.get().effective_price, 150.0)
+
+        Review.objects.filter(rating=5).get().delete()
+        self.assertEqual(ProductListing.objects.get().review_count, 1)
+
+    def test_unchanged_saves_skip_the_derived_tables(self):
+        with self.assertNumQueries(2):  # The snapshot read and the UPDATE
+            self.product.save()
+        with self.assertNumQueries(2):
+            self.category.save()
+
+    def test_renames_rewrite_only_the_copied_columns(self):
+        with mock.patch('api.signals.refresh_listings') as refresh:
+            self.sub_category.slug = "droid"
+            self.sub_category.save()
+            Category.objects.filter(pk=self.category.pk).update(name="Mobiles")
+            bulk_changed.send(sender=Category, action="updated", ids=[self.category.pk], fields=["name"])
+        refresh.assert_not_called()
+        listing = ProductListing.objects.get()
+        self.assertEqual((listing.category_name, listing.sub_category_slug), ("Mobiles", "droid"))
+        self.assertEqual(self.client.get('/api/products/', {'sub_category': "droid"}).json()['results'][0]['id'],
+                         self.product.id)
+
+    def test_deleting_a_product_with_reviews_drops_its_row(self):
+        Review.objects.create(product=self.product, user=self.user, rating=3)
+        Discount.objects.create(product=self.product, discount_percentage=10)
+        self.category.delete()
+        self.assertFalse(ProductListing.objects.exists())
+
+    def test_rebuild_listing_restores_rows(self):
+        Product.objects.filter(pk=self.product.pk).update(price=180)
+        ProductListing.objects.all().delete()
+        call_command('rebuild_listing', stdout=open(os.devnull, 'w'))
+        self.assertEqual(ProductListing.objects.get().price, 180.0)
+
+
+class EffectivePriceTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        self.products = [self.make_product(f"P{i}", price=100) for i in range(100)]
+        self.user = self.make_user("shopper")
+        self.ids = [p.id for p in self.products]
+
+    def test_cart_is_priced_in_bounded_queries_and_then_cached(self):
+        Discount.objects.create(product=self.products[0], discount_percentage=10)
+        Discount.objects.create(product=self.products[1], user=self.user, discount_percentage=30)
+        with self.assertNumQueries(2):
+            prices = effective_prices(self.ids, user=self.user)
+        self.assertEqual(len(prices), 100)
+        self.assertEqual((prices[self.ids[0]].effective_price, prices[self.ids[1]].effective_price), (90.0, 70.0))
+        self.assertEqual(prices[self.ids[2]], (100.0, None, 100.0))
+        with self.assertNumQueries(0):
+            effective_prices(self.ids, user=self.user)
+
+    def test_discount_changes_and_new_days_are_picked_up(self):
+        today = localdate()
+        effective_prices(self.ids[:1])
+        with self.captureOnCommitCallbacks(execute=True):
+            discount = Discount.objects.create(product=self.products[0], discount_percentage=20, end_date=today)
+        self.assertEqual(effective_prices(self.ids[:1], on=today)[self.ids[0]].effective_price, 80.0)
+        self.assertEqual(effective_prices(self.ids[:1], on=today + timedelta(days=1))[self.ids[0]].effective_price, 100.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            discount.delete()
+        self.assertEqual(effective_prices(self.ids[:1], on=today)[self.ids[0]].effective_price, 100.0)
+
+    def test_changes_drop_only_the_affected_entries(self):
+        effective_prices(self.ids, user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].price = 50
+            self.products[0].save()
+            Discount.objects.create(product=self.products[1], user=self.user, discount_percentage=30)
+        self.products[2].name = "Renamed"
+        with mock.patch.object(price_cache, 'delete_many') as delete_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.products[2].save()
+        delete_many.assert_not_called()
+        with self.assertNumQueries(2):  # The first product and the user's discounts
+            prices = effective_prices(self.ids, user=self.user)
+        self.assertEqual((prices[self.ids[0]].effective_price, prices[self.ids[1]].effective_price), (50.0, 70.0))
+
+    def test_rolled_back_changes_keep_the_cached_prices(self):
+        effective_prices(self.ids[:1])
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                self.products[0].price = 50
+                self.products[0].save()
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.assertEqual(effective_prices(self.ids[:1])[self.ids[0]].effective_price, 100.0)
+
+
+class SweepDiscountsTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        self.product = self.make_product("Phone", price=100)
+        self.today = localdate()
+
+    def sweep(self):
+        call_command('sweep_discounts', '--batch-size', '1', stdout=open(os.devnull, 'w'))
+
+    def test_discounts_follow_their_dates(self):
+        expired = Discount.objects.create(product=self.product, discount_percentage=10, end_date=self.today - timedelta(days=1))
+        upcoming = Discount.objects.create(product=self.product, discount_percentage=30, start_date=self.today + timedelta(days=1))
+        paused = Discount.objects.create(product=self.product, discount_percentage=50, active=False)
+        self.sweep()
+        states = lambda: {d.id: (d.active, d.scheduled) for d in Discount.objects.all()}
+        self.assertEqual(states(), {expired.id: (False, False), upcoming.id: (False, True), paused.id: (False, False)})
+
+        Discount.objects.filter(pk=upcoming.pk).update(start_date=self.today)
+        self.sweep()
+        self.assertEqual(states()[upcoming.id], (True, False))
+        self.assertEqual(ProductListing.objects.get().effective_price, 70.0)
+        self.assertEqual(effective_prices([self.product.id])[self.product.id].effective_price, 70.0)
+
+    def test_active_discount_opening_today_refreshes_the_listing(self):
+        # Created before today, so its listing was priced without it
+        Discount.objects.create(product=self.product, discount_percentage=40, start_date=self.today)
+        ProductListing.objects.update(effective_price=100, refreshed_at=now() - timedelta(days=1))
+        self.sweep()
+        self.assertEqual(ProductListing.objects.get().effective_price, 60.0)
+        with mock.patch('api.management.commands.sweep_discounts.bulk_changed') as changed:
+            self.sweep()
+        changed.send.assert_not_called()
+
+
+class RatingCountersTest(Fixtures, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        self.phone = self.make_product("Phone", price=100)
+        self.tablet = self.make_product("Tablet", price=300)
+        self.user = self.sign_in(self.make_user("critic"))
+
+    def totals(self, product):
+        rating = ProductRating.objects.get(product=product)
+        return rating.count, rating.total, rating.stars
+
+    def test_review_writes_keep_totals_and_listing_current(self):
+        for stars in (5, 3):
+            response = self.client.post('/api/reviews/', {'product': self.phone.id, 'user': self.user.id, 'rating': stars})
+            self.assertEqual(response.status_code, 201)
+        review_id = response.data['id']
+        self.assertEqual(self.totals(self.phone), (2, 8, [0, 0, 1, 0, 1]))
+
+        self.client.put(f'/api/reviews/{review_id}/', {'rating': 1, 'product': self.tablet.id})
+        self.assertEqual(self.totals(self.phone), (1, 5, [0, 0, 0, 0, 1]))
+        self.assertEqual(self.totals(self.tablet), (1, 1, [1, 0, 0, 0, 0]))
+
+        self.client.delete(f'/api/reviews/{review_id}/')
+        self.assertEqual(self.totals(self.tablet), (0, 0, [0, 0, 0, 0, 0]))
+
+        with self.assertNumQueries(2):  # The page and this user's discounts
+            results = self.client.get('/api/products/').json()['results']
+        self.assertEqual(
+            [(p['average_rating'], p['review_count'], p['star_counts']) for p in results],
+            [(5.0, 1, [0, 0, 0, 0, 1]), (None, 0, [0, 0, 0, 0, 0])],
+        )
+
+    def test_reconcile_fixes_drifted_totals(self):
+        Review.objects.create(product=self.phone, user=self.user, rating=4)
+        ProductRating.objects.filter(product=self.phone).update(count=7, star_4=0)
+        ProductRating.objects.create(product=self.tablet, count=2, total=6)
+        call_command('reconcile_ratings', '--batch-size', '1', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.totals(self.phone), (1, 4, [0, 0, 0, 1, 0]))
+        self.assertFalse(ProductRating.objects.filter(product=self.tablet).exists())
+        self.assertEqual(ProductListing.objects.get(product=self.phone).review_count, 1)
@@ -0,0 +1,106 @@
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import LocalTTLCache
+
+# Counts of finished windows never change, so each process remembers them
+previous_windows = LocalTTLCache(size=getattr(settings, 'THROTTLE_LOCAL_SIZE', 10000), ttl=60)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding-window-counter throttle with O(1) state per key.
+
+    Each key keeps one integer counter per fixed window in the shared cache.
+    The request rate is estimated as the current window's count plus the
+    previous window's count weighted by how much of it still overlaps the
+    sliding window. The previous window's final count is read once per window
+    and kept in process memory, so a request normally costs a single cache
+    operation: an atomic ``incr`` of the current counter.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+
+        self.current = self.increment(f'{self.key}:{window}')
+        self.previous = self.previous_count(f'{self.key}:{window - 1}')
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current > self.num_requests:
+            return self.throttle_failure()
+        return True
+
+    def increment(self, key):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # First request in this window. The counter lives two windows so
+            # it can still be read as the previous one.
+            if self.cache.add(key, 1, self.duration * 2):
+                return 1
+            return self.cache.incr(key)
+
+    def previous_count(self, key):
+        count = previous_windows.get(key)
+        if count is None:
+            count = self.cache.get(key, 0)
+            previous_windows.set(key, count, ttl=self.duration - self.elapsed)
+        return count
+
+    def wait(self):
+        if self.current > self.num_requests or not self.previous:
+            # Only the next window clears the excess
+            return self.duration - self.elapsed
+        # Wait until enough of the previous window has slid out
+        needed = 1 - (self.num_requests - self.current) / self.previous
+        return max(needed * self.duration - self.elapsed, 0)
+
+
+class ScopedSlidingThrottle(SlidingWindowThrottle):
+    """
+    The one throttle every request goes through: the scope and rate are picked
+    once per request, so each request costs a single counter.
+
+    Views set ``throttle_scope`` to a scope name, or to a ``{method: scope}``
+    mapping to limit e.g. OTP sending (POST) and checking (PUT) separately.
+    Requests without a scope fall back to the ``user`` rate for authenticated
+    users and the ``anon`` rate for everyone else. Users are counted by id,
+    anonymous clients by IP.
+    """
+
+    def __init__(self):
+        # The rate depends on the view and the caller, so it is resolved in allow_request
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if isinstance(scope, dict):
+            scope = scope.get(request.method)
+        if scope:
+            return scope
+        user = getattr(request, 'user', None)
+        return 'user' if user and user.is_authenticated else 'anon'
+
+    def get_cache_key(self, request, view):
+        # Also used by the plain async views, whose request may have no user
+        user = getattr(request, 'user', None)
+        if user and user.is_authenticated:
+            ident = user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
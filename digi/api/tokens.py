@@ -0,0 +1,138 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. ``might_contain`` never gives a false
+    negative; false positives happen at roughly ``error_rate`` once
+    ``capacity`` items were added.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistIndex:
+    """
+    In-process Bloom filter of blacklisted refresh token ids.
+
+    A token whose jti is not in the filter is certainly not blacklisted, so the
+    blacklist table is only queried for the rare filter hit. The filter is
+    synced incrementally (new BlacklistedToken rows by id) whenever the shared
+    ``jwt-blacklist:version`` key changes, which every blacklisting bumps, or
+    at the latest every JWT_BLACKLIST_SYNC_SECONDS.
+    """
+
+    version_key = 'jwt-blacklist:version'
+
+    def __init__(self):
+        self.capacity = getattr(settings, 'JWT_BLACKLIST_BLOOM_CAPACITY', 100000)
+        self.sync_interval = getattr(settings, 'JWT_BLACKLIST_SYNC_SECONDS', 60)
+        self._lock = threading.Lock()
+        self._filter = BloomFilter(self.capacity)
+        self._last_id = 0
+        self._version = None
+        self._synced_at = None
+
+    def sync(self):
+        version = cache.get(self.version_key)
+        with self._lock:
+            if (
+                self._synced_at is not None
+                and version == self._version
+                and time.monotonic() - self._synced_at < self.sync_interval
+            ):
+                return
+            self._load()
+            self._version = version
+            self._synced_at = time.monotonic()
+
+    def _load(self):
+        rows = (
+            BlacklistedToken.objects.filter(id__gt=self._last_id)
+            .order_by('id').values_list('id', 'token__jti')
+        )
+        for row_id, jti in rows.iterator(chunk_size=5000):
+            self._filter.add(jti)
+            self._last_id = row_id
+        if self._filter.count > self.capacity:
+            # Past capacity the false positive rate climbs; rebuild bigger
+            self.capacity *= 2
+            self._filter = BloomFilter(self.capacity)
+            self._last_id = 0
+            self._load()
+
+    def might_contain(self, jti):
+        self.sync()
+        return self._filter.might_contain(jti)
+
+    def add(self, jti):
+        with self._lock:
+            self._filter.add(jti)
+
+    def changed(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, time.time_ns(), None)
+
+
+blacklist_index = BlacklistIndex()
+
+
+# Copied into every token so read-only views can skip the user lookup
+# (api.authentication.ClaimsJWTAuthentication)
+USER_CLAIMS = ('username', 'email', 'is_staff', 'is_active')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    Refresh token whose blacklist check consults ``blacklist_index`` before
+    the database, and which carries ``USER_CLAIMS``.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+    def check_blacklist(self):
+        if blacklist_index.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_index.add(self.payload[api_settings.JTI_CLAIM])
+        return result
@@ -6,6 +6,8 @@ urlpatterns = [
     # Auth endpoints
     path('auth/register/', UserRegistrationView.as_view(), name='user_register'),
     path('auth/login/', UserLoginView.as_view(), name='user_login'),
+    path('auth/register/async/', AsyncUserRegistrationView.as_view(), name='user_register_async'),
+    path('auth/login/async/', AsyncUserLoginView.as_view(), name='user_login_async'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/logout/', logout_view, name='logout'),
     
@@ -21,20 +23,29 @@ urlpatterns = [
 
     # Product endpoints
     path('products/', ProductView.as_view(), name='product_list'),
+    path('products/search/', ProductSearchView.as_view(), name='product_search'),
+    path('products/facets/', ProductFacetsView.as_view(), name='product_facets'),
+    path('products/export/', ProductExportView.as_view(), name='product_export'),
+    path('products/bulk/', ProductBulkView.as_view(), name='product_bulk'),
     path('products/<int:product_id>/', ProductView.as_view(), name='product_detail'),
 
     # Order endpoints
     path('orders/', OrderView.as_view(), name='order_list'),
     path('orders/<int:order_id>/', OrderView.as_view(), name='order_detail'),
+    path('orders/<int:order_id>/items/', OrderItemsView.as_view(), name='order_items'),
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
 
     # Address endpoint
     path('addresses/', AddressView.as_view(), name='address_list'),
 
     # Category endpoints
     path('categories/', CategoryView.as_view(), name='category_list'),
+    path('categories/tree/', CategoryTreeView.as_view(), name='category_tree'),
+    path('categories/bulk/', CategoryBulkView.as_view(), name='category_bulk'),
 
     # Subcategory endpoints
     path('subcategories/', SubCategoryView.as_view(), name='subcategory_list'),
+    path('subcategories/bulk/', SubCategoryBulkView.as_view(), name='subcategory_bulk'),
     path('subcategories/<int:id>/', SubCategoryView.as_view(), name='subcategory_detail'),
 
     # Product Images & Descriptions
@@ -42,6 +53,7 @@ urlpatterns = [
 
     # Discount endpoint
     path('discounts/', DiscountView.as_view(), name='discount_list'),
+    path('discounts/bulk/', DiscountBulkView.as_view(), name='discount_bulk'),
 
     # Wishlist endpoint
     path('wishlists/', WishlistView.as_view(), name='wishlist_list'),
@@ -54,6 +66,7 @@ urlpatterns = [
 
     # Review endpoint
     path('reviews/', ReviewView.as_view(), name='review_list'),
+    path('reviews/<int:review_id>/', ReviewView.as_view(), name='review_detail'),
 
     # Audit Log endpoint
     path('audit-logs/', AuditLogView.as_view(), name='audit_log_list'),
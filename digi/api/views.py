@@ -1,24 +1,44 @@
 from rest_framework.views import APIView
+from rest_framework.generics import GenericAPIView
+from rest_framework.mixins import ListModelMixin
 from rest_framework.response import Response
-from rest_framework import status, request
+from rest_framework import status, request, serializers
 from django.views import View
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.cache import parse_etags
 from django.shortcuts import get_object_or_404
 import json
+import logging
+import math
 from .serializers import *
-from rest_framework.permissions import AllowAny, IsAuthenticated
-import psutil
-import django
-import sys
-import platform
-from django.db import connection
-from django.conf import settings
-import os
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAdminUser, IsAuthenticated
+import time
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import ClaimsJWTAuthentication
+from .throttling import ScopedSlidingThrottle
+from .tokens import RefreshToken, add_user_claims
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from .filters import CommaSeparatedField, QueryParamFilterBackend
+from .pagination import ListingCursorPagination, ProductCursorPagination, RankedKeysetPagination
+from .search import SEARCH_MODES, fuzzy_matches
+from .facets import browse_facets, facet_counts
+from .pricing import discounted_price, personal_discounts
+from .renderers import NDJSONRenderer
+from .cache import build_payload, catalog_cache
+from .health import SYSTEM_INFO, system_sampler
+from .signals import bulk_changed
+from .diagnostics import event
+from .hashers import acheck_password, amake_password
 
 
+auth_logger = logging.getLogger('api.auth')
 
 
 class UserRegistrationView(APIView):
@@ -52,23 +72,8 @@ class UserRegistrationView(APIView):
         }
     )
     def post(self, request, *args, **kwargs):
-        # Print request data for debugging
-        print(f"Registration attempt with data: {request.data}")
-        
-        # Check for existing users with similar data (extra validation)
-        username = request.data.get('username')
-        email = request.data.get('email')
-        phone_number = request.data.get('phone_number')
-        
-        # Debug existing users
-        print(f"Current users in DB: {members.objects.count()}")
-        if username:
-            print(f"Users with username '{username}': {members.objects.filter(username=username).count()}")
-        if email:
-            print(f"Users with email '{email}': {members.objects.filter(email=email).count()}")
-        if phone_number:
-            print(f"Users with phone '{phone_number}': {members.objects.filter(phone_number=phone_number).count()}")
-        
+        event(auth_logger, "registration.attempt", username=request.data.get('username'))
+
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
@@ -77,14 +82,38 @@ class UserRegistrationView(APIView):
             response_data = serializer.data
             response_data['refresh'] = str(refresh)
             response_data['access'] = str(refresh.access_token)
+            event(auth_logger, "registration.success", logging.INFO, user_id=user.id)
             return Response(response_data, status=status.HTTP_201_CREATED)
-        
-        # Enhanced error response
-        print(f"Validation errors: {serializer.errors}")
+
+        event(auth_logger, "registration.invalid", errors=serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _login_tokens(user):
+    """
+    Login response body. The refresh token is built without recording an
+    OutstandingToken, so issuing it does not touch the database.
+    """
+    from rest_framework_simplejwt.settings import api_settings
+
+    refresh = RefreshToken()
+
+    # Set the user ID in the token payload
+    refresh[api_settings.USER_ID_CLAIM] = user.id
+
+    # Add custom claims
+    add_user_claims(refresh, user)
+
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'username': user.username,
+        'email': user.email
+    }
+
+
 class UserLoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'login'
 
     @extend_schema(
         summary="User login",
@@ -111,15 +140,11 @@ class UserLoginView(APIView):
     )
     def post(self, request, *args, **kwargs):
         try:
-            # Debug incoming request data
-            print(f"Login request data: {request.data}")
-            
             login_id = request.data.get('login_id')
             password = request.data.get('password')
-            
-            print(f"Attempting login with: login_id={login_id}")
-            print(f"All users: {list(members.objects.values_list('id', 'username', 'email'))}")
-            
+
+            event(auth_logger, "login.attempt", login_id=login_id)
+
             # Check if login_id exists
             if not login_id:
                 return Response(
@@ -131,21 +156,13 @@ class UserLoginView(APIView):
             user = None
             
             try:
-                if '@' in login_id:
-                    # Try email login
-                    try:
-                        user = members.objects.get(email__iexact=login_id)
-                        print(f"Found user by email: {user.email}")
-                    except members.DoesNotExist:
-                        print(f"No user found with email: {login_id}")
-                else:
-                    # Try username login
-                    try:
-                        user = members.objects.get(username__iexact=login_id)
-                        print(f"Found user by username: {user.username}")
-                    except members.DoesNotExist:
-                        print(f"No user found with username: {login_id}")
-                    
+                # Single lookup on the UPPER(email)/UPPER(username) expression indexes
+                lookup = 'email__iexact' if '@' in login_id else 'username__iexact'
+                try:
+                    user = members.objects.get(**{lookup: login_id})
+                except members.DoesNotExist:
+                    event(auth_logger, "login.user_not_found", lookup=lookup)
+
                 if not user:
                     return Response(
                         {"detail": "User not found", "code": "user_not_found"},
@@ -154,7 +171,7 @@ class UserLoginView(APIView):
                 
                 # Verify password
                 if not user.check_password(password):
-                    print(f"Password check failed for user {user.username}")
+                    event(auth_logger, "login.invalid_password", logging.INFO, user_id=user.id)
                     return Response(
                         {"detail": "Invalid password", "code": "invalid_password"},
                         status=status.HTTP_401_UNAUTHORIZED
@@ -167,56 +184,151 @@ class UserLoginView(APIView):
                         status=status.HTTP_401_UNAUTHORIZED
                     )
                 
-                # Generate tokens - use custom token generation approach
-                print(f"Generating tokens for user: {user.username}")
-                
-                # Create the tokens manually
-                from rest_framework_simplejwt.tokens import RefreshToken
-                from rest_framework_simplejwt.settings import api_settings
-
-                refresh = RefreshToken()
-                
-                # Set the user ID in the token payload
-                refresh[api_settings.USER_ID_CLAIM] = user.id 
-                
-                # Add custom claims
-                refresh['username'] = user.username
-                refresh['email'] = user.email
-                
-                # Get the access token from the refresh token
-                access_token = str(refresh.access_token)
-                
-                return Response({
-                    'refresh': str(refresh),
-                    'access': access_token,
-                    'username': user.username,
-                    'email': user.email
-                }, status=status.HTTP_200_OK)
+                event(auth_logger, "login.success", user_id=user.id)
+                return Response(_login_tokens(user), status=status.HTTP_200_OK)
                 
             except Exception as e:
-                print(f"Error during user lookup: {str(e)}")
+                event(auth_logger, "login.lookup_error", logging.ERROR, exc_info=True, login_id=login_id)
                 return Response(
                     {"detail": f"Authentication error: {str(e)}", "code": "auth_error"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
                 
         except Exception as e:
-            print(f"Unexpected error in login view: {str(e)}")
+            event(auth_logger, "login.unexpected_error", logging.ERROR, exc_info=True)
             return Response(
                 {"detail": f"An unexpected error occurred: {str(e)}", "code": "server_error"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
+class AsyncAuthView(View):
+    """
+    Base for the async auth endpoints. They run natively under ASGI: database
+    access uses the async ORM and password hashing runs in the bounded pool
+    from ``api.hashers``, so a worker keeps serving other requests while
+    hashes are computed. Like the DRF auth views they are CSRF exempt.
+
+    DRF's throttles don't run for plain views, so ``dispatch`` applies the
+    same ScopedSlidingThrottle: the view's ``throttle_scope``, or the anon and
+    user rates without one.
+    """
+    http_method_names = ['post']
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        throttle = ScopedSlidingThrottle()
+        if not await sync_to_async(throttle.allow_request)(request, self):
+            return JsonResponse(
+                {"detail": "Request was throttled.", "code": "throttled"},
+                status=429, headers={'Retry-After': str(math.ceil(throttle.wait()))},
+            )
+        return await super().dispatch(request, *args, **kwargs)
+
+    def parse_body(self, request):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+class AsyncUserLoginView(AsyncAuthView):
+    throttle_scope = 'login'
+
+    async def post(self, request, *args, **kwargs):
+        data = self.parse_body(request)
+        if data is None:
+            return JsonResponse({"detail": "Invalid JSON body", "code": "parse_error"}, status=400)
+
+        login_id = data.get('login_id')
+        password = data.get('password') or ''
+        event(auth_logger, "login.attempt", login_id=login_id)
+
+        if not login_id:
+            return JsonResponse({"detail": "Login ID is required", "code": "login_id_required"}, status=400)
+
+        lookup = 'email__iexact' if '@' in login_id else 'username__iexact'
+        user = await members.objects.filter(**{lookup: login_id}).afirst()
+        if user is None:
+            event(auth_logger, "login.user_not_found", lookup=lookup)
+            return JsonResponse({"detail": "User not found", "code": "user_not_found"}, status=401)
+
+        if not await acheck_password(user, password):
+            event(auth_logger, "login.invalid_password", logging.INFO, user_id=user.id)
+            return JsonResponse({"detail": "Invalid password", "code": "invalid_password"}, status=401)
+
+        if not user.is_active:
+            return JsonResponse({"detail": "User account is inactive", "code": "user_inactive"}, status=401)
+
+        event(auth_logger, "login.success", user_id=user.id)
+        return JsonResponse(_login_tokens(user))
+
+
+class AsyncUserRegistrationView(AsyncAuthView):
+    async def post(self, request, *args, **kwargs):
+        data = self.parse_body(request)
+        if data is None:
+            return JsonResponse({"detail": "Invalid JSON body", "code": "parse_error"}, status=400)
+        event(auth_logger, "registration.attempt", username=data.get('username'))
+
+        serializer = AsyncUserSerializer(data=data)
+        if not serializer.is_valid():
+            event(auth_logger, "registration.invalid", errors=serializer.errors)
+            return JsonResponse(serializer.errors, status=400)
+        validated = serializer.validated_data
+
+        identity = {
+            'username': validated['username'],
+            'phone_number': validated.get('phone_number'),
+            'email': validated.get('email'),
+        }
+        conflicts = await afind_identity_conflicts(**identity)
+        if conflicts:
+            return JsonResponse(conflicts, status=400)
+
+        user = members(
+            username=members.normalize_username(validated['username']),
+            first_name=validated.get('first_name', ''),
+            last_name=validated.get('last_name', ''),
+            email=members.objects.normalize_email(validated.get('email')),
+            phone_number=validated.get('phone_number', ''),
+        )
+        user.password = await amake_password(validated['password'])
+        try:
+            await user.asave(force_insert=True)
+        except IntegrityError:
+            # Lost a race with a concurrent registration
+            conflicts = await afind_identity_conflicts(**identity)
+            if not conflicts:
+                raise
+            return JsonResponse(conflicts, status=400)
+
+        refresh = await sync_to_async(RefreshToken.for_user)(user)
+        response_data = dict(AsyncUserSerializer(user).data)
+        response_data['refresh'] = str(refresh)
+        response_data['access'] = str(refresh.access_token)
+        event(auth_logger, "registration.success", logging.INFO, user_id=user.id)
+        return JsonResponse(response_data, status=201)
+
+
 # email and SMS verification:
 class EmailVerificationView(APIView):
+    throttle_scope = {'POST': 'otp_send', 'PUT': 'otp_verify'}
+
     @extend_schema(
         summary="Send verification email",
         description="Send a verification email to the user's registered email address.",
         tags=["Authentication"],
         request=EmailVerificationRequestSerializer,
         responses={
-            201: OpenApiResponse(description="Verification email sent successfully"),
+            201: OpenApiResponse(description="Verification email queued for delivery"),
             400: OpenApiResponse(description="Invalid input data")
         }
     )
@@ -226,7 +338,9 @@ class EmailVerificationView(APIView):
         """
         serializer = EmailVerificationRequestSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            # The verification row and its outbox message commit together
+            with transaction.atomic():
+                serializer.save()
             return Response({"message": "Verification email sent."}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -252,13 +366,15 @@ class EmailVerificationView(APIView):
 
 
 class SMSVerificationView(APIView):
+    throttle_scope = {'POST': 'otp_send', 'PUT': 'otp_verify'}
+
     @extend_schema(
         summary="Send verification SMS",
         description="Send a verification code via SMS to the user's registered phone number.",
         tags=["Authentication"],
         request=SMSVerificationRequestSerializer,
         responses={
-            201: OpenApiResponse(description="Verification SMS sent successfully"),
+            201: OpenApiResponse(description="Verification SMS queued for delivery"),
             400: OpenApiResponse(description="Invalid input data")
         }
     )
@@ -268,13 +384,15 @@ class SMSVerificationView(APIView):
         """
         serializer = SMSVerificationRequestSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            # The verification row and its outbox message commit together
+            with transaction.atomic():
+                serializer.save()
             return Response({"message": "Verification SMS sent."}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @extend_schema(
         summary="Verify SMS code",
-        description="Verify the code sent to the user's phone via SMS.",
+        description="Verify the code sent to the user's phone via SMS. Both the phone number and the code are required.",
         tags=["Authentication"],
         request=SMSVerificationSerializer,
         responses={
@@ -286,7 +404,7 @@ class SMSVerificationView(APIView):
         """
         Verify SMS code.
         """
-        serializer = SMSVerificationSerializer(data=request.data)
+        serializer = SMSVerificationSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response({"message": "Phone number verified successfully."}, status=status.HTTP_200_OK)
@@ -296,7 +414,18 @@ class SMSVerificationView(APIView):
 
 
 # Address API View
-class AddressView(APIView):
+class AddressView(ListModelMixin, GenericAPIView):
+    serializer_class = AddressSerializer
+    filter_fields = {
+        'city': ('City', serializers.CharField(max_length=20)),
+        'postal_code': ('Postal_code', serializers.CharField(max_length=10)),
+    }
+    ordering_fields = ['id', 'created_at', 'City']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        return Address.objects.filter(user=self.request.user)
+
     @extend_schema(
         summary="List user addresses",
         description="Retrieve all addresses associated with the authenticated user.",
@@ -306,9 +435,7 @@ class AddressView(APIView):
         }
     )
     def get(self, request):
-        addresses = Address.objects.all()
-        serializer = AddressSerializer(addresses, many=True)
-        return Response(serializer.data)
+        return self.list(request)
 
     @extend_schema(
         summary="Create new address",
@@ -323,7 +450,7 @@ class AddressView(APIView):
     def post(self, request):
         serializer = AddressSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(user=request.user)
             return Response({"message": "Address created successfully."}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -339,7 +466,7 @@ class AddressView(APIView):
     )
     def put(self, request, address_id):
         try:
-            address = Address.objects.get(id=address_id)
+            address = self.get_queryset().get(id=address_id)
             serializer = AddressSerializer(address, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
@@ -359,7 +486,7 @@ class AddressView(APIView):
     )
     def delete(self, request, address_id):
         try:
-            address = Address.objects.get(id=address_id)
+            address = self.get_queryset().get(id=address_id)
             address.delete()
             return Response({"message": "Address deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
         except Address.DoesNotExist:
@@ -367,7 +494,47 @@ class AddressView(APIView):
 
 
 # Category API View
-class CategoryView(APIView):
+def _cached_response(request, payload):
+    """
+    Serve a cached payload, answering 304 when the client already has it.
+    """
+    etag = payload['etag']
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(payload['data'], headers={'ETag': etag})
+
+
+class CatalogReadMixin:
+    """
+    For catalog views that also take writes: reads authenticate from the
+    token claims and use the ``catalog`` rate, while writes keep the default
+    authentication and the anon/user rates.
+    """
+    throttle_scope = {method: 'catalog' for method in SAFE_METHODS}
+
+    def get_authenticators(self):
+        # No request while the schema is generated
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            return [ClaimsJWTAuthentication()]
+        return super().get_authenticators()
+
+
+def _load_categories():
+    return build_payload(CategorySerializer(Category.objects.order_by('id'), many=True).data)
+
+
+def _load_subcategories():
+    return build_payload(SubCategorySerializer(SubCategory.objects.order_by('id'), many=True).data)
+
+
+def _load_category_tree():
+    categories = Category.objects.order_by('id').prefetch_related('subcategories')
+    return build_payload(CategoryTreeSerializer(categories, many=True).data)
+
+
+class CategoryView(CatalogReadMixin, APIView):
+
     @extend_schema(
         summary="List all categories",
         description="Retrieve all product categories available in the store.",
@@ -377,9 +544,8 @@ class CategoryView(APIView):
         }
     )
     def get(self, request):
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        payload = catalog_cache.get_or_set('categories', _load_categories)
+        return _cached_response(request, payload)
 
     @extend_schema(
         summary="Create new category",
@@ -438,8 +604,27 @@ class CategoryView(APIView):
 
 
 
+class CategoryTreeView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    throttle_scope = 'catalog'
+
+    @extend_schema(
+        summary="Category tree",
+        description="Retrieve every category with its subcategories nested inside. Served from cache and invalidated whenever a category or subcategory changes; supports If-None-Match.",
+        tags=["Categories"],
+        responses={
+            200: CategoryTreeSerializer(many=True),
+            304: OpenApiResponse(description="Tree unchanged since the given ETag")
+        }
+    )
+    def get(self, request):
+        payload = catalog_cache.get_or_set('tree', _load_category_tree)
+        return _cached_response(request, payload)
+
+
 # SubCategory View
-class SubCategoryView(APIView):
+class SubCategoryView(CatalogReadMixin, APIView):
+
     @extend_schema(
         summary="List all subcategories",
         description="Retrieve all product subcategories available in the store.",
@@ -449,9 +634,8 @@ class SubCategoryView(APIView):
         }
     )
     def get(self, request):
-        subcategories = SubCategory.objects.all()
-        serializer = SubCategorySerializer(subcategories, many=True)
-        return Response(serializer.data)
+        payload = catalog_cache.get_or_set('subcategories', _load_subcategories)
+        return _cached_response(request, payload)
 
     @extend_schema(
         summary="Create new subcategory",
@@ -510,39 +694,82 @@ class SubCategoryView(APIView):
             return Response({"error": "SubCategory not found."}, status=status.HTTP_404_NOT_FOUND)
 
 # Product View
-class ProductView(APIView):
+def _listing_data(listing, personal):
+    effective_price = listing.effective_price
+    if personal.get(listing.product_id) and listing.price is not None:
+        # The listing carries the public price; a personal discount may beat it
+        effective_price = min(effective_price, discounted_price(listing.price, personal[listing.product_id]))
+    return {
+        "id": listing.product_id,
+        "name": listing.name,
+        "description": listing.description,
+        "price": listing.price,
+        "effective_price": effective_price,
+        "category": listing.category_name,
+        "sub_category": listing.sub_category_name,
+        "tags": listing.tags,
+        "average_rating": listing.average_rating,
+        "review_count": listing.review_count,
+        "star_counts": listing.star_counts,
+    }
+
+
+# Filters over Product for facets and export
+PRODUCT_FILTER_FIELDS = {
+    'category': ('category__slug', serializers.SlugField()),
+    'sub_category': ('sub_category__slug', serializers.SlugField()),
+    'min_price': ('price__gte', serializers.FloatField()),
+    'max_price': ('price__lte', serializers.FloatField()),
+    'tag': ('tags__contains', CommaSeparatedField(child=serializers.CharField(max_length=50))),
+    # ?tags=a,b needs every tag, ?tags_any=a,b at least one (GIN on tags)
+    'tags': ('tags__contains', CommaSeparatedField(child=serializers.CharField(max_length=50))),
+    'tags_any': ('tags__overlap', CommaSeparatedField(child=serializers.CharField(max_length=50))),
+}
+
+# The same filters over ProductListing, which stores the slugs itself
+LISTING_FILTER_FIELDS = {
+    **PRODUCT_FILTER_FIELDS,
+    'category': ('category_slug', serializers.SlugField()),
+    'sub_category': ('sub_category_slug', serializers.SlugField()),
+}
+
+
+class ProductView(CatalogReadMixin, GenericAPIView):
+    # Reads come from the denormalized listing table, so no joins
+    queryset = ProductListing.objects.all()
+    serializer_class = ProductSerializer
+    pagination_class = ListingCursorPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = LISTING_FILTER_FIELDS
+
     @extend_schema(
         summary="List all products",
-        description="Retrieve a paginated list of all available products with optional filtering.",
+        description="Retrieve a cursor-paginated list of products ordered by id, with review stats and the price after the best discount available to the caller, personal discounts included. Pages are read from a denormalized listing table, so a page costs one single-table query regardless of catalog size.",
         tags=["Products"],
+        parameters=[
+            OpenApiParameter(name="category", description="Filter by category slug", type=str),
+            OpenApiParameter(name="sub_category", description="Filter by subcategory slug", type=str),
+            OpenApiParameter(name="min_price", description="Minimum price", type=float),
+            OpenApiParameter(name="max_price", description="Maximum price", type=float),
+            OpenApiParameter(name="tag", description="Only products carrying this tag", type=str),
+            OpenApiParameter(name="tags", description="Comma separated tags; products must carry all of them", type=str),
+            OpenApiParameter(name="tags_any", description="Comma separated tags; products must carry at least one", type=str),
+            OpenApiParameter(name="cursor", description="Opaque cursor taken from the previous page's next/previous link", type=str),
+            OpenApiParameter(name="page_size", description="Items per page (max 100)", type=int),
+        ],
         responses={
             200: OpenApiResponse(description="List of products")
         }
     )
     def get(self, request, product_id=None):
         if product_id:
-            product = get_object_or_404(Product, id=product_id)
-            data = {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": product.price,
-                "category": product.category.name if product.category else None,
-                "sub_category": product.sub_category.name if product.sub_category else None,
-                "tags": product.tags
-            }
-        else:
-            products = Product.objects.all()
-            data = [{
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": product.price,
-                "category": product.category.name if product.category else None,
-                "sub_category": product.sub_category.name if product.sub_category else None,
-                "tags": product.tags
-            } for product in products]
-        return JsonResponse(data, safe=False)
+            listing = get_object_or_404(self.get_queryset(), product_id=product_id)
+            return JsonResponse(_listing_data(listing, personal_discounts(request.user)))
+
+        listings = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(listings)
+        personal = personal_discounts(request.user)
+        return self.get_paginated_response([_listing_data(listing, personal) for listing in page])
 
     @extend_schema(
         summary="Create new product",
@@ -601,6 +828,139 @@ class ProductView(APIView):
             return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
 
 
+class ProductSearchView(GenericAPIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    throttle_scope = 'catalog'
+    # The listing table carries the search vector and the trigram index on name
+    queryset = ProductListing.objects.defer('search_vector')
+    serializer_class = ProductSerializer
+    pagination_class = RankedKeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = LISTING_FILTER_FIELDS
+    query_field = serializers.CharField(max_length=200)
+
+    @extend_schema(
+        summary="Search products",
+        description="Full-text search over product name, tags, summary and description, best matches first. Matches in the name weigh most, then tags, summary and description. When nothing matches as typed, the search falls back to typo-tolerant matching on product names. Results are keyset paginated; follow the next link for more.",
+        tags=["Products"],
+        parameters=[
+            OpenApiParameter(name="q", description="Search text (quoted phrases, `or` and `-word` are supported)", type=str, required=True),
+        ],
+        responses={
+            200: OpenApiResponse(description="Ranked products"),
+            400: OpenApiResponse(description="Missing or invalid search text")
+        }
+    )
+    def get(self, request):
+        try:
+            text = self.query_field.run_validation(request.query_params.get('q', ''))
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'q': exc.detail})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        cursor = self.paginator.decode_cursor(request)
+        mode = cursor.get('mode', 'text') if cursor else 'text'
+        if mode not in SEARCH_MODES:
+            raise NotFound(self.paginator.invalid_cursor_message)
+
+        self.cursor_state = {'mode': mode}
+        page = self.paginate_queryset(SEARCH_MODES[mode](queryset, text))
+        if not page and cursor is None:
+            # Nothing matched as typed: retry tolerating typos
+            self.cursor_state = {'mode': 'fuzzy'}
+            page = self.paginate_queryset(fuzzy_matches(queryset, text))
+        personal = personal_discounts(request.user)
+        return self.get_paginated_response([{**_listing_data(listing, personal), "rank": listing.rank} for listing in page])
+
+
+class ProductFacetsView(GenericAPIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    throttle_scope = 'catalog'
+    queryset = Product.objects.all()
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = PRODUCT_FILTER_FIELDS
+
+    @extend_schema(
+        summary="Product facets",
+        description="Product counts per tag, category and subcategory for the products matching the given filters (the same filters as the product list). Tags are limited to the most common ones. Without filters the counts come from a maintained summary table instead of scanning products.",
+        tags=["Products"],
+        responses={
+            200: OpenApiResponse(description="Facet counts")
+        }
+    )
+    def get(self, request):
+        if any(request.query_params.get(param) for param in self.filter_fields):
+            facets = facet_counts(self.filter_queryset(self.get_queryset()))
+        else:
+            facets = browse_facets()
+
+        categories = {str(c['id']): c for c in catalog_cache.get_or_set('categories', _load_categories)['data']}
+        sub_categories = {str(s['id']): s for s in catalog_cache.get_or_set('subcategories', _load_subcategories)['data']}
+        return Response({
+            "tags": [{"tag": value, "count": count} for value, count in facets["tag"]],
+            "categories": [
+                {"id": int(value), "slug": categories[value]['slug'], "name": categories[value]['name'], "count": count}
+                for value, count in facets["category"] if value in categories
+            ],
+            "sub_categories": [
+                {"id": int(value), "slug": sub_categories[value]['slug'], "name": sub_categories[value]['name'], "count": count}
+                for value, count in facets["sub_category"] if value in sub_categories
+            ],
+        })
+
+
+# Product export
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _ndjson_stream(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def _json_array_stream(rows):
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+        separator = ","
+    yield "]"
+
+
+class ProductExportView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    throttle_scope = 'catalog'
+    renderer_classes = [JSONRenderer, NDJSONRenderer]
+    filter_fields = PRODUCT_FILTER_FIELDS
+
+    @extend_schema(
+        summary="Export the product catalog",
+        description="Stream every product (optionally filtered like the product list) as a JSON array or as newline delimited JSON. Rows are read with a server-side cursor and written as they arrive, so memory use stays flat whatever the catalog size.",
+        tags=["Products"],
+        parameters=[
+            OpenApiParameter(name="format", description="json (default) or ndjson", type=str, enum=["json", "ndjson"]),
+        ],
+        responses={
+            200: OpenApiResponse(description="Streamed product rows")
+        }
+    )
+    def get(self, request):
+        products = QueryParamFilterBackend().filter_queryset(request, Product.objects.all(), self)
+        rows = products.order_by('id').values(
+            'id', 'name', 'description', 'summary', 'price', 'img', 'tags',
+            category_name=F('category__name'),
+            sub_category_name=F('sub_category__name'),
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+        if request.accepted_renderer.format == 'ndjson':
+            response = StreamingHttpResponse(_ndjson_stream(rows), content_type='application/x-ndjson')
+            response['Content-Disposition'] = 'attachment; filename="products.ndjson"'
+        else:
+            response = StreamingHttpResponse(_json_array_stream(rows), content_type='application/json')
+            response['Content-Disposition'] = 'attachment; filename="products.json"'
+        return response
+
+
 # Product Images Descriptions View
 class ProductImagesDescriptionsView(APIView):
     @extend_schema(
@@ -672,7 +1032,16 @@ class ProductImagesDescriptionsView(APIView):
             return Response({"error": "Description not found."}, status=status.HTTP_404_NOT_FOUND)
 
 # Discount View
-class DiscountView(APIView):
+class DiscountView(ListModelMixin, GenericAPIView):
+    queryset = Discount.objects.all()
+    serializer_class = DiscountSerializer
+    filter_fields = {
+        'product': ('product_id', serializers.IntegerField()),
+        'active': ('active', serializers.BooleanField()),
+    }
+    ordering_fields = ['id', 'created_at', 'discount_percentage', 'start_date', 'end_date']
+    ordering = ['-id']
+
     @extend_schema(
         summary="List discounts",
         description="Retrieve all available product discounts.",
@@ -682,9 +1051,7 @@ class DiscountView(APIView):
         }
     )
     def get(self, request):
-        discounts = Discount.objects.all()
-        serializer = DiscountSerializer(discounts, many=True)
-        return Response(serializer.data)
+        return self.list(request)
 
     @extend_schema(
         summary="Create discount",
@@ -741,8 +1108,197 @@ class DiscountView(APIView):
         except Discount.DoesNotExist:
             return Response({"error": "Discount not found."}, status=status.HTTP_404_NOT_FOUND)
 
+# Bulk catalog writes
+class BulkView(APIView):
+    """
+    Batch create (POST), update (PATCH) and delete (DELETE) for one model.
+
+    The body is a JSON array of up to BULK_MAX_ITEMS items; updates carry the
+    ``id`` of their target. Targets and referenced rows are loaded with one
+    ``in_bulk`` query each, every item is validated in a single pass, and the
+    batch is written with one ``bulk_create``/``bulk_update``/``delete`` in a
+    transaction. The batch is all-or-nothing: if any item fails validation or
+    conflicts with a database constraint, nothing is written and the per-item
+    results say which items failed and why.
+    """
+    permission_classes = [IsAdminUser]
+    model = None
+    serializer_class = None
+
+    def get_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise serializers.ValidationError({"detail": "Expected a JSON array of objects."})
+        limit = getattr(settings, 'BULK_MAX_ITEMS', 5000)
+        if len(items) > limit:
+            raise serializers.ValidationError({"detail": f"At most {limit} items per request."})
+        return items
+
+    def get_serializer_context(self, items):
+        # Every referenced row, per related model, in one query each
+        related = {}
+        for field in self.model._meta.concrete_fields:
+            if not field.many_to_one:
+                continue
+            ids = {parse_id(item.get(field.name)) for item in items} - {None}
+            model = field.related_model
+            related[model] = {**related.get(model, {}), **model.objects.in_bulk(ids)}
+        return {'request': self.request, 'related': related}
+
+    @staticmethod
+    def target_id(item):
+        # JSON ids only; True would otherwise match the row with id 1
+        pk = item.get('id')
+        return pk if isinstance(pk, int) and not isinstance(pk, bool) else None
+
+    def write(self, action, results, pending, write, **signal_kwargs):
+        """
+        Write ``pending`` (``(result, row)`` pairs) with ``write(rows)``, which
+        returns the ids written. If the batch hits a constraint, each row is
+        retried in a savepoint of a rolled back transaction to tell which
+        items conflict.
+        """
+        if any(result['status'] == 'invalid' for result in results):
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+        rows = [row for _, row in pending]
+        try:
+            with transaction.atomic():
+                ids = write(rows)
+        except IntegrityError:
+            with transaction.atomic():
+                for result, row in pending:
+                    try:
+                        with transaction.atomic():
+                            write([row])
+                    except IntegrityError as e:
+                        result.update(status="conflict", errors={"detail": [str(e).strip()]})
+                transaction.set_rollback(True)
+            return Response({"results": results}, status=status.HTTP_409_CONFLICT)
+        bulk_changed.send(sender=self.model, action=action, ids=ids, **signal_kwargs)
+        return Response({"results": results})
+
+    def post(self, request):
+        items = self.get_items(request)
+        context = self.get_serializer_context(items)
+        results, pending = [], []
+        for index, item in enumerate(items):
+            serializer = self.serializer_class(data=item, context=context)
+            if serializer.is_valid():
+                results.append({"index": index, "status": "created"})
+                pending.append((results[-1], self.model(**serializer.validated_data)))
+            else:
+                results.append({"index": index, "status": "invalid", "errors": serializer.errors})
+
+        def write(instances):
+            self.model.objects.bulk_create(instances)
+            return [instance.pk for instance in instances]
+
+        response = self.write("created", results, pending, write)
+        if response.status_code == status.HTTP_200_OK:
+            for result, instance in pending:
+                result["id"] = instance.pk
+        return response
+
+    def patch(self, request):
+        items = self.get_items(request)
+        ids = [self.target_id(item) for item in items]
+        targets = self.model.objects.in_bulk({pk for pk in ids if pk is not None})
+        context = self.get_serializer_context(items)
+        results, pending, fields, seen, previous = [], [], set(), set(), {}
+        for index, (pk, item) in enumerate(zip(ids, items)):
+            if pk is None:
+                results.append({"index": index, "id": item.get('id'), "status": "invalid",
+                                "errors": {"id": ["A valid integer is required."]}})
+                continue
+            instance = targets.get(pk)
+            if instance is None:
+                results.append({"index": index, "id": pk, "status": "invalid", "errors": {"id": ["Not found."]}})
+                continue
+            if pk in seen:
+                results.append({"index": index, "id": pk, "status": "invalid", "errors": {"id": ["Duplicate id in batch."]}})
+                continue
+            seen.add(pk)
+            serializer = self.serializer_class(instance, data=item, partial=True, context=context)
+            if not serializer.is_valid():
+                results.append({"index": index, "id": pk, "status": "invalid", "errors": serializer.errors})
+                continue
+            previous[pk] = {}
+            for name, value in serializer.validated_data.items():
+                attname = self.model._meta.get_field(name).attname
+                previous[pk][attname] = getattr(instance, attname)
+                setattr(instance, name, value)
+            fields.update(serializer.validated_data)
+            results.append({"index": index, "id": pk, "status": "updated"})
+            pending.append((results[-1], instance))
+
+        def write(instances):
+            if fields:
+                self.model.objects.bulk_update(instances, sorted(fields), batch_size=1000)
+            return [instance.pk for instance in instances]
+
+        return self.write("updated", results, pending, write, fields=sorted(fields), previous=previous)
+
+    def delete(self, request):
+        items = self.get_items(request)
+        ids = [self.target_id(item) for item in items]
+        existing = set(
+            self.model.objects.filter(id__in={pk for pk in ids if pk is not None}).values_list('id', flat=True)
+        )
+        results, pending = [], []
+        for index, (pk, item) in enumerate(zip(ids, items)):
+            if pk is None:
+                results.append({"index": index, "id": item.get('id'), "status": "invalid",
+                                "errors": {"id": ["A valid integer is required."]}})
+            elif pk not in existing:
+                results.append({"index": index, "id": pk, "status": "invalid", "errors": {"id": ["Not found."]}})
+            else:
+                results.append({"index": index, "id": pk, "status": "deleted"})
+                pending.append((results[-1], pk))
+
+        def write(pks):
+            self.model.objects.filter(id__in=pks).delete()
+            return sorted(set(pks))
+
+        return self.write("deleted", results, pending, write)
+
+
+@extend_schema(tags=["Products"], request=ProductBulkSerializer(many=True))
+class ProductBulkView(BulkView):
+    model = Product
+    serializer_class = ProductBulkSerializer
+
+
+@extend_schema(tags=["Categories"], request=CategoryBulkSerializer(many=True))
+class CategoryBulkView(BulkView):
+    model = Category
+    serializer_class = CategoryBulkSerializer
+
+
+@extend_schema(tags=["Categories"], request=SubCategoryBulkSerializer(many=True))
+class SubCategoryBulkView(BulkView):
+    model = SubCategory
+    serializer_class = SubCategoryBulkSerializer
+
+
+@extend_schema(tags=["Products"], request=DiscountBulkSerializer(many=True))
+class DiscountBulkView(BulkView):
+    model = Discount
+    serializer_class = DiscountBulkSerializer
+
+
 # Wishlist View
-class WishlistView(APIView):
+class WishlistView(ListModelMixin, GenericAPIView):
+    serializer_class = WishlistSerializer
+    filter_fields = {
+        'product': ('product_id', serializers.IntegerField()),
+    }
+    ordering_fields = ['id', 'created_at']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        # Only live items; matches the partial (user, created_at) index
+        return Wishlist.objects.filter(user=self.request.user, deleted_at__isnull=True)
+
     @extend_schema(
         summary="List wishlist items",
         description="Retrieve all items in the authenticated user's wishlist.",
@@ -753,11 +1309,9 @@ class WishlistView(APIView):
     )
     def get(self, request):
         """
-        Retrieve a list of all wishlist items.
+        Retrieve the user's wishlist items.
         """
-        wishlists = Wishlist.objects.all()
-        serializer = WishlistSerializer(wishlists, many=True)
-        return Response(serializer.data)
+        return self.list(request)
 
     @extend_schema(
         summary="Add to wishlist",
@@ -775,7 +1329,7 @@ class WishlistView(APIView):
         """
         serializer = WishlistSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -793,17 +1347,27 @@ class WishlistView(APIView):
         Delete a wishlist item by ID.
         """
         try:
-            wishlist = Wishlist.objects.get(id=wishlist_id)
+            wishlist = Wishlist.objects.get(id=wishlist_id, user=request.user)
             wishlist.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Wishlist.DoesNotExist:
             return Response({"error": "Wishlist item not found."}, status=status.HTTP_404_NOT_FOUND)
 
 # Payment View
-class PaymentView(APIView):
+class PaymentView(ListModelMixin, GenericAPIView):
+    serializer_class = PaymentSerializer
+    filter_fields = {
+        'payment_type': ('Payment_type', serializers.CharField(max_length=20)),
+    }
+    ordering_fields = ['id', 'created_at']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        return Payment.objects.filter(user=self.request.user)
+
     @extend_schema(
         summary="List payment records",
-        description="Retrieve payment information for all orders. Admin access required.",
+        description="Retrieve the authenticated user's payment records.",
         tags=["Orders"],
         responses={
             200: OpenApiResponse(description="List of payment records")
@@ -811,11 +1375,9 @@ class PaymentView(APIView):
     )
     def get(self, request):
         """
-        Retrieve all payment records.
+        Retrieve the user's payment records.
         """
-        payments = Payment.objects.all()
-        serializer = PaymentSerializer(payments, many=True)
-        return Response(serializer.data)
+        return self.list(request)
 
     @extend_schema(
         summary="Process payment",
@@ -833,7 +1395,7 @@ class PaymentView(APIView):
         """
         serializer = PaymentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -852,7 +1414,7 @@ class PaymentView(APIView):
         Update a payment record by ID.
         """
         try:
-            payment = Payment.objects.get(id=payment_id)
+            payment = self.get_queryset().get(id=payment_id)
             payment.payment_type = request.data.get('payment_type', payment.payment_type)
             payment.save()
             return Response({"message": "Payment updated successfully."})
@@ -873,14 +1435,26 @@ class PaymentView(APIView):
         Delete a payment record by ID.
         """
         try:
-            payment = Payment.objects.get(id=payment_id)
+            payment = self.get_queryset().get(id=payment_id)
             payment.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Payment.DoesNotExist:
             return Response({"error": "Payment not found."}, status=status.HTTP_404_NOT_FOUND)
 
 # Order View
-class OrderView(APIView):
+class OrderView(ListModelMixin, GenericAPIView):
+    serializer_class = OrderSerializer
+    filter_fields = {
+        'status': ('status', serializers.ChoiceField(choices=Order.STATUS_CHOICES)),
+        'created_after': ('created_at__gte', serializers.DateTimeField()),
+        'created_before': ('created_at__lt', serializers.DateTimeField()),
+    }
+    ordering_fields = ['id', 'created_at', 'total_amount']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user)
+
     @extend_schema(
         summary="List user orders",
         description="Retrieve all orders placed by the authenticated user.",
@@ -891,13 +1465,11 @@ class OrderView(APIView):
     )
     def get(self, request, order_id=None):
         if order_id:
-            order = get_object_or_404(Order, id=order_id)
+            order = get_object_or_404(self.get_queryset(), id=order_id)
             serializer = OrderSerializer(order)
             return Response(serializer.data)
         else:
-            orders = Order.objects.all()
-            serializer = OrderSerializer(orders, many=True)
-            return Response(serializer.data)
+            return self.list(request)
 
     @extend_schema(
         summary="Create new order",
@@ -912,7 +1484,7 @@ class OrderView(APIView):
     def post(self, request):
         serializer = OrderSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(user=request.user)
             return Response({"message": "Order created successfully."}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -928,7 +1500,7 @@ class OrderView(APIView):
     )
     def put(self, request, order_id):
         try:
-            order = get_object_or_404(Order, id=order_id)
+            order = get_object_or_404(self.get_queryset(), id=order_id)
             serializer = OrderSerializer(order, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
@@ -948,12 +1520,60 @@ class OrderView(APIView):
     )
     def delete(self, request, order_id):
         try:
-            order = get_object_or_404(Order, id=order_id)
+            order = get_object_or_404(self.get_queryset(), id=order_id)
             order.delete()
             return Response({"message": "Order deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
         except Order.DoesNotExist:
             return Response({"error": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
 
+class OrderItemsView(APIView):
+    @extend_schema(
+        summary="Add items to an order",
+        description="Add many items to a pending order in one request. Unit prices are the caller's effective prices, discounts included, as at checkout; items are inserted in bulk and the order total is recalculated once.",
+        tags=["Orders"],
+        request=OrderLineSerializer(many=True),
+        responses={
+            201: OpenApiResponse(description="Items added"),
+            400: OpenApiResponse(description="Invalid input data, unknown product or order no longer pending"),
+            404: OpenApiResponse(description="Order not found")
+        }
+    )
+    def post(self, request, order_id):
+        order = get_object_or_404(Order, id=order_id, user=request.user)
+        serializer = OrderLineSerializer(data=request.data, many=True, allow_empty=False)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            items = order.add_items(serializer.validated_data)
+        except (Product.DoesNotExist, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "order": order.id,
+            "total_amount": order.total_amount,
+            "items": OrderItemSerializer(items, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+class CheckoutView(APIView):
+    @extend_schema(
+        summary="Checkout",
+        description="Create an order with its items, shipping record and payment in one request. Items are priced from the current product price and the best active discount; if a submitted price no longer matches, nothing is written.",
+        tags=["Orders"],
+        request=CheckoutSerializer,
+        responses={
+            201: OpenApiResponse(description="Order placed"),
+            400: OpenApiResponse(description="Invalid cart, unavailable product or changed price")
+        }
+    )
+    def post(self, request):
+        serializer = CheckoutSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        order = serializer.save()
+        response_data = OrderSerializer(order).data
+        response_data['items'] = OrderItemSerializer(order.items.all(), many=True).data
+        response_data['shipping'] = ShippingSerializer(order.shipping).data
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
 # Shipping View
 class ShippingView(APIView):
     @extend_schema(
@@ -1026,7 +1646,17 @@ class ShippingView(APIView):
         return JsonResponse({"message": "Shipping deleted successfully"}, status=204)
 
 # Review View
-class ReviewView(APIView):
+class ReviewView(CatalogReadMixin, ListModelMixin, GenericAPIView):
+    queryset = Review.objects.all()
+    serializer_class = ReviewSerializer
+    filter_fields = {
+        'product': ('product_id', serializers.IntegerField()),
+        'rating': ('rating', serializers.IntegerField(min_value=1, max_value=5)),
+        'min_rating': ('rating__gte', serializers.IntegerField(min_value=1, max_value=5)),
+    }
+    ordering_fields = ['id', 'created_at', 'rating']
+    ordering = ['-id']
+
     @extend_schema(
         summary="List all reviews",
         description="Retrieve all product reviews with ratings and comments.",
@@ -1035,13 +1665,13 @@ class ReviewView(APIView):
             200: OpenApiResponse(description="List of product reviews")
         }
     )
-    def get(self, request):
+    def get(self, request, review_id=None):
         """
-        Retrieve all product reviews.
+        Retrieve all product reviews, or one by ID.
         """
-        reviews = Review.objects.all()
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if review_id:
+            return Response(self.get_serializer(get_object_or_404(self.get_queryset(), id=review_id)).data)
+        return self.list(request)
 
     @extend_schema(
         summary="Create product review",
@@ -1059,7 +1689,9 @@ class ReviewView(APIView):
         """
         serializer = ReviewSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # The product's rating totals are updated in the same transaction
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1083,7 +1715,8 @@ class ReviewView(APIView):
 
         serializer = ReviewSerializer(review, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
             return Response({"message": "Review updated successfully."})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1104,11 +1737,25 @@ class ReviewView(APIView):
         if not review:
             return Response({"error": "Review not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        review.delete()
+        with transaction.atomic():
+            review.delete()
         return Response({"message": "Review deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 # AuditLog View
-class AuditLogView(APIView):
+class AuditLogView(ListModelMixin, GenericAPIView):
+    queryset = AuditLog.objects.all()
+    serializer_class = AuditLogSerializer
+    filter_fields = {
+        'action': ('action', serializers.CharField(max_length=50)),
+        'model_name': ('model_name', serializers.CharField(max_length=50)),
+        'record_id': ('record_id', serializers.IntegerField()),
+        'user': ('user_id', serializers.IntegerField()),
+        'since': ('timestamp__gte', serializers.DateTimeField()),
+        'until': ('timestamp__lt', serializers.DateTimeField()),
+    }
+    ordering_fields = ['id', 'timestamp']
+    ordering = ['-id']
+
     @extend_schema(
         summary="List audit logs",
         description="Retrieve audit logs for system activities. Admin access required.",
@@ -1121,9 +1768,7 @@ class AuditLogView(APIView):
         """
         Retrieve all audit logs.
         """
-        logs = AuditLog.objects.all()
-        serializer = AuditLogSerializer(logs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.list(request)
 
     @extend_schema(
         summary="Create audit log",
@@ -1193,7 +1838,7 @@ class HealthCheckView(APIView):
 
     @extend_schema(
         summary="System Health Check",
-        description="Get detailed system health information including Python, Django, database, and system resources. Used for monitoring and diagnostics.",
+        description="Get detailed system health information including Python, Django, database, and system resources. Values come from a background sampler refreshed every HEALTH_SAMPLE_INTERVAL seconds; sampled_at and age_seconds tell how fresh they are. Used for monitoring and diagnostics.",
         tags=["System"],
         responses={
             200: OpenApiResponse(
@@ -1219,78 +1864,25 @@ class HealthCheckView(APIView):
                                 "percent": 50.0,
                                 "used": 8000000000,
                             },
+                            "sampled_at": "2025-01-10T06:38:00Z",
+                            "age_seconds": 2.417,
+                            "sample_interval": 10,
                         }
                     )
                 ]
-            )
+            ),
+            202: OpenApiResponse(description="The worker just started and has no sample yet"),
         },
     )
     def get(self, request):
-        # System Info
-        system_info = {
-            "os": platform.system(),
-            "os_version": platform.version(),
-            "python_version": sys.version,
-            "django_version": django.get_version(),
-        }
-
-        # CPU Info
-        cpu_info = {
-            "cpu_count": psutil.cpu_count(),
-            "cpu_percent": psutil.cpu_percent(interval=1),
-        }
-
-        # Memory Info
-        memory = psutil.virtual_memory()
-        memory_info = {
-            "total": memory.total,
-            "available": memory.available,
-            "percent": memory.percent,
-            "used": memory.used,
-        }
-
-        # Disk Info
-        disk = psutil.disk_usage('/')
-        disk_info = {
-            "total": disk.total,
-            "used": disk.used,
-            "free": disk.free,
-            "percent": disk.percent,
-        }
-
-        # Database Check
-        db_status = "healthy"
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1")
-        except Exception as e:
-            db_status = f"unhealthy: {str(e)}"
-
-        # Storage Check
-        storage_status = "healthy"
-        try:
-            test_file_path = os.path.join(settings.MEDIA_ROOT, 'test.txt')
-            with open(test_file_path, 'w') as f:
-                f.write('test')
-            os.remove(test_file_path)
-        except Exception as e:
-            storage_status = f"unhealthy: {str(e)}"
-
-        response_data = {
-            "status": "healthy",
-            "system": system_info,
-            "cpu": cpu_info,
-            "memory": memory_info,
-            "disk": disk_info,
-            "database": {
-                "status": db_status,
-                "engine": settings.DATABASES['default']['ENGINE'],
-            },
-            "storage": {
-                "status": storage_status,
-            }
-        }
-
+        snapshot = system_sampler.snapshot()
+        if snapshot is None:
+            # A fresh worker is up; report that instead of failing its probe
+            return Response({"status": "warming up", "system": SYSTEM_INFO}, status=status.HTTP_202_ACCEPTED)
+        response_data = {key: value for key, value in snapshot.items() if not key.startswith('_')}
+        response_data["system"] = SYSTEM_INFO
+        response_data["sample_interval"] = system_sampler.interval
+        response_data["age_seconds"] = round(time.monotonic() - snapshot["_monotonic"], 3)
         return Response(response_data)
 
 class DebugUsersView(APIView):
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digi.settings')
 
 application = get_asgi_application()
+
+# Serving processes sample health from the start, so the first probe finds a
+# snapshot (api/health.py)
+from api.health import system_sampler  # noqa: E402
+
+system_sampler.start()
@@ -260,8 +260,26 @@ SCHEMA = {
                     {
                         "name": "category",
                         "in": "query",
-                        "description": "Filter by category ID",
-                        "schema": {"type": "integer"}
+                        "description": "Filter by category slug",
+                        "schema": {"type": "string"}
+                    },
+                    {
+                        "name": "sub_category",
+                        "in": "query",
+                        "description": "Filter by subcategory slug",
+                        "schema": {"type": "string"}
+                    },
+                    {
+                        "name": "tag",
+                        "in": "query",
+                        "description": "Only products carrying this tag",
+                        "schema": {"type": "string"}
+                    },
+                    {
+                        "name": "cursor",
+                        "in": "query",
+                        "description": "Opaque cursor from the previous page's next/previous link",
+                        "schema": {"type": "string"}
                     },
                     {
                         "name": "search",
@@ -290,7 +308,6 @@ SCHEMA = {
                                 "schema": {
                                     "type": "object",
                                     "properties": {
-                                        "count": {"type": "integer"},
                                         "next": {"type": "string", "format": "uri", "nullable": True},
                                         "previous": {"type": "string", "format": "uri", "nullable": True},
                                         "results": {
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 from datetime import timedelta
+import os
 
 from pathlib import Path
 
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'api',
     'corsheaders',
     'rest_framework',
@@ -99,6 +101,78 @@ DATABASES = {
 }
 
 
+# Cache
+# Redis is shared by every worker; without REDIS_URL each process falls back
+# to its own in-memory cache, which is fine for development.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Read-through cache used for the category tree (see api/cache.py)
+TIERED_CACHE_TIMEOUT = 60 * 60  # Shared tier, seconds
+TIERED_CACHE_LOCAL_SIZE = 128  # Entries kept per process
+TIERED_CACHE_LOCAL_TTL = 5  # Seconds a worker may serve its local copy
+
+# Effective prices, bucketed by day (see api/pricing.py)
+PRICE_CACHE_TIMEOUT = 24 * 60 * 60
+PRICE_CACHE_LOCAL_SIZE = 10000
+
+
+# Seconds between background health samples (api/health.py)
+HEALTH_SAMPLE_INTERVAL = 10
+
+# Most common tags returned by the product facets endpoint
+FACET_TAG_LIMIT = 50
+
+
+# Outbox (api/outbox.py): emails and SMS are queued in the database and
+# delivered by `manage.py drain_outbox --loop`.
+# Point EMAIL_HOST/EMAIL_PORT at a local stand-in (e.g. MailHog on 1025) in development.
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = 'no-reply@example.com'
+SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL')  # Messages are only logged when unset
+SMS_GATEWAY_TIMEOUT = 10
+OUTBOX_CONCURRENCY = {  # Parallel deliveries per provider
+    'email': 4,
+    'sms': 8,
+}
+OUTBOX_LEASE_SECONDS = 60  # A claimed batch becomes due again if the worker dies
+OUTBOX_RETRY_BASE_SECONDS = 30  # Doubles after every failed attempt
+OUTBOX_MAX_ATTEMPTS = 5
+
+
+# Password hashing
+# New and rehashed passwords use Argon2. Older hashers stay listed so existing
+# hashes still verify; they are upgraded on the user's next successful login.
+# Tune the cost for the host with `python manage.py benchmark_hasher`.
+PASSWORD_HASHERS = [
+    'api.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 102400))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 8))
+# Threads hashing passwords for the async auth views (per process)
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 4))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,19 +218,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.ListPagination",
+    "PAGE_SIZE": 50,
+    "DEFAULT_FILTER_BACKENDS": [
+        "api.filters.QueryParamFilterBackend",
+        "rest_framework.filters.OrderingFilter",
+    ],
+    # One sliding-window counter (api/throttling.py) per request: the view's
+    # `throttle_scope` if it has one, otherwise the `user` or `anon` rate.
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'api.throttling.ScopedSlidingThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'login': '20/min',
+        'otp_send': '3/min',
+        'otp_verify': '10/min',
+        'catalog': '600/min',
     }
 }
 
@@ -202,8 +287,19 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.TokenRefreshSerializer',
 }
 
+# Per-process caches for authentication (api/authentication.py, api/tokens.py).
+# A user is served from memory for AUTH_USER_CACHE_TTL seconds after loading;
+# the refresh token blacklist Bloom filter resyncs when another process
+# blacklists a token (through the shared cache) or every
+# JWT_BLACKLIST_SYNC_SECONDS.
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_TTL = 30
+JWT_BLACKLIST_BLOOM_CAPACITY = 100000
+JWT_BLACKLIST_SYNC_SECONDS = 60
+
 # Security Settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -245,3 +341,28 @@ CORS_ALLOW_HEADERS = [
 # Custom User Model
 AUTH_USER_MODEL = 'api.members'
 
+
+# Logging: the api loggers emit one JSON object per event (see api/diagnostics.py).
+# Set API_LOG_LEVEL=DEBUG to see per-request auth diagnostics.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'api.diagnostics.StructuredFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.environ.get('API_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}